@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
     'rest_framework',
     'rest_framework.authtoken',
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,4 +135,71 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# How uploaded media is served (see core.media): 'python', or
+# 'x-accel' / 'x-sendfile' to hand files over to the front proxy.
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'python')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
 AUTH_USER_MODEL = 'core.User'
+
+# Request phases are timed by core.timing and logged at INFO level to
+# the 'core.timing' logger; set TIMING_LOG_LEVEL=WARNING to silence it.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'timing': {
+            'format': '%(asctime)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'timing': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'timing',
+        },
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['timing'],
+            'level': os.environ.get('TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Request metrics (see core.metrics), served at /internal/metrics/ to
+# requests with an "Authorization: Bearer <METRICS_TOKEN>" header; the
+# endpoint is disabled without a token. With several worker processes,
+# point METRICS_DIR to a directory emptied on startup, for the workers
+# to share their values.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Token authentication cache (see user.authentication)
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 60
+
+# Signed access tokens (see user.tokens). Each process checks them
+# against its copy of the revocations, reloaded at most every
+# TOKEN_DENY_LIST_INTERVAL seconds; revocations made by other workers
+# take effect within that delay.
+TOKEN_DENY_LIST_INTERVAL = 2
+ACCESS_TOKEN_LIFETIME = 5 * 60
+REFRESH_TOKEN_LIFETIME = 30 * 24 * 60 * 60
+
+# Recipe image uploads (see recipe.images)
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+IMAGE_RENDITIONS = {
+    'thumbnail': (160, 160),
+    'medium': (640, 640),
+    'large': (1280, 1280),
+}
+IMAGE_RENDITION_WORKERS = 2
+IMAGE_RENDITIONS_ASYNC = True
+# Recipe imports (see core.imports)
+IMPORT_UPLOAD_MAX_SIZE = 512 * 1024 * 1024
+# Unreferenced images are kept this long before `manage.py gc_images`
+# deletes them (see core.storage).
+IMAGE_BLOB_GC_GRACE = 60 * 60
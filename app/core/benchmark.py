@@ -0,0 +1,240 @@
+"""In-process benchmark of the API endpoints (see the bench command).
+
+Requests go through the test client, so the timings cover the whole
+Django and DRF stack of an endpoint but not the network or the server.
+Requests that write run in a savepoint that is rolled back, so every
+sample of an endpoint sees the same data and results are comparable
+across runs of the same dataset.
+"""
+import io
+import json
+import math
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user import tokens
+from .models import Ingredient, Recipe, Tag
+
+PASSWORD = 'bench-password'
+SAFE_METHODS = ('get', 'head', 'options')
+
+# An endpoint request: ``request()`` returns the test client keyword
+# arguments of each sample, so uploads get a fresh file every time.
+Endpoint = namedtuple('Endpoint', 'name method url request')
+
+
+def percentile(samples, p):
+    """The nearest-rank ``p``th percentile of ``samples``."""
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def jpeg():
+    upload = io.BytesIO()
+    Image.new('RGB', (640, 480), (200, 120, 40)).save(upload, 'JPEG')
+    upload.seek(0)
+    upload.name = 'bench.jpg'
+    return upload
+
+
+def ndjson(recipes):
+    upload = io.BytesIO(b''.join(
+        json.dumps({
+            'title': f'Imported {i}', 'time_minutes': 10, 'price': '4.50',
+            'tags': ['Imported'], 'ingredients': ['Salt'],
+        }).encode() + b'\n'
+        for i in range(recipes)
+    ))
+    upload.name = 'recipes.ndjson'
+    return upload
+
+
+def endpoints(user, batch_size=50):
+    """The requests driving every endpoint of the recipe and user APIs
+    as ``user``, whose library was seeded.
+    """
+    tag_ids = list(Tag.objects.filter(user=user).order_by(
+        'id').values_list('id', flat=True)[:2])
+    ingredient_ids = list(Ingredient.objects.filter(user=user).order_by(
+        'id').values_list('id', flat=True)[:2])
+    recipe_id = Recipe.objects.filter(user=user).order_by(
+        'id').values_list('id', flat=True).first()
+    revoked = tokens.issue(user)['refresh']
+    refresh = tokens.issue(user)['refresh']
+    recipe = {
+        'title': 'Bench recipe', 'time_minutes': 20, 'price': '6.50',
+        'tags': tag_ids, 'ingredients': ingredient_ids,
+    }
+
+    def url(name, *args):
+        return reverse(name, args=args)
+
+    def call(**kwargs):
+        return lambda: kwargs
+
+    def list_endpoints(model):
+        prefix = f'recipe:{model}'
+        return [
+            Endpoint(f'{model} list', 'get', url(f'{prefix}-list'), call()),
+            Endpoint(f'{model} create', 'post', url(f'{prefix}-list'),
+                     call(data={'name': 'Bench'})),
+            Endpoint(f'{model} autocomplete', 'get',
+                     url(f'{prefix}-autocomplete'),
+                     call(data={'prefix': model[:3]})),
+            Endpoint(f'{model} bulk', 'post', url(f'{prefix}-bulk'),
+                     call(data={'names': [f'{model}-1', 'Bench']},
+                          format='json')),
+            Endpoint(f'{model} export', 'get', url(f'{prefix}-export'),
+                     call()),
+        ]
+
+    detail = url('recipe:recipe-detail', recipe_id)
+    return [
+        Endpoint('api root', 'get', url('recipe:api-root'), call()),
+        *list_endpoints('tag'),
+        *list_endpoints('ingredient'),
+        Endpoint('recipe list', 'get', url('recipe:recipe-list'), call()),
+        Endpoint('recipe list filtered', 'get', url('recipe:recipe-list'),
+                 call(data={'tags': ','.join(map(str, tag_ids)),
+                            'price_max': 20, 'ordering': 'price'})),
+        Endpoint('recipe create', 'post', url('recipe:recipe-list'),
+                 call(data=recipe, format='json')),
+        Endpoint('recipe batch', 'post', url('recipe:recipe-batch'),
+                 call(data=[recipe] * batch_size, format='json')),
+        Endpoint('recipe export', 'get', url('recipe:recipe-export'),
+                 call()),
+        Endpoint('recipe import', 'post', url('recipe:recipe-import'),
+                 lambda: {'data': {'file': ndjson(batch_size)},
+                          'format': 'multipart'}),
+        Endpoint('recipe search', 'get', url('recipe:recipe-search'),
+                 call(data={'q': 'recipe'})),
+        Endpoint('recipe stats', 'get', url('recipe:recipe-stats'), call()),
+        Endpoint('recipe stream', 'get', url('recipe:recipe-stream'),
+                 call()),
+        Endpoint('recipe detail', 'get', detail, call()),
+        Endpoint('recipe update', 'put', detail,
+                 call(data=recipe, format='json')),
+        Endpoint('recipe partial update', 'patch', detail,
+                 call(data={'price': '7.00'}, format='json')),
+        Endpoint('recipe delete', 'delete', detail, call()),
+        Endpoint('recipe upload image', 'post',
+                 url('recipe:recipe-upload-image', recipe_id),
+                 lambda: {'data': {'image': jpeg()},
+                          'format': 'multipart'}),
+        Endpoint('user create', 'post', url('user:create'),
+                 call(data={'email': 'bench-new@example.com',
+                            'password': PASSWORD, 'name': 'Bench'})),
+        Endpoint('user token', 'post', url('user:token'),
+                 call(data={'email': user.email, 'password': PASSWORD})),
+        Endpoint('user signed token', 'post', url('user:token'),
+                 call(data={'email': user.email, 'password': PASSWORD,
+                            'token_type': 'signed'})),
+        Endpoint('user token refresh', 'post', url('user:token-refresh'),
+                 call(data={'refresh': refresh})),
+        Endpoint('user token revoke', 'post', url('user:token-revoke'),
+                 call(data={'refresh': revoked})),
+        Endpoint('user me', 'get', url('user:me'), call()),
+        Endpoint('user me update', 'patch', url('user:me'),
+                 call(data={'name': 'Bench'})),
+    ]
+
+
+def client(user):
+    """A test client authenticated as ``user``: with a signed access
+    token where accepted, and a database token otherwise.
+    """
+    access = tokens.issue(user)['access']
+    token = Token.objects.get_or_create(user=user)[0].key
+
+    class BenchClient(APIClient):
+        def generic(self, method, path, *args, **kwargs):
+            keyword, key = ('Token', token) if path.startswith(
+                reverse('user:me')) else ('Bearer', access)
+            kwargs.setdefault('HTTP_AUTHORIZATION', f'{keyword} {key}')
+            return super().generic(method, path, *args, **kwargs)
+
+    return BenchClient()
+
+
+def sample(client, endpoint):
+    """Time one request of ``endpoint``, including the streaming of its
+    body. Returns the response, the milliseconds and the query count.
+    """
+    kwargs = endpoint.request()
+    rollback = endpoint.method not in SAFE_METHODS
+    with transaction.atomic(), \
+            CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = getattr(client, endpoint.method)(endpoint.url, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+        transaction.set_rollback(rollback)
+
+    return response, elapsed, len(queries)
+
+
+def run(user_id, requests, warmup=5, batch_size=50, only=None):
+    """Benchmark every endpoint as the user and return its results:
+    the status and the p50/p95/p99 latencies in milliseconds and the
+    number of queries of a request.
+    """
+    user = get_user_model().objects.get(pk=user_id)
+    user.set_password(PASSWORD)
+    user.save()
+    bench_client = client(user)
+
+    results = {}
+    for endpoint in endpoints(user, batch_size):
+        if only and endpoint.name not in only:
+            continue
+        for _ in range(warmup):
+            sample(bench_client, endpoint)
+
+        timings, query_counts = [], []
+        for _ in range(requests):
+            response, elapsed, query_count = sample(bench_client, endpoint)
+            timings.append(elapsed)
+            query_counts.append(query_count)
+
+        results[endpoint.name] = {
+            'method': endpoint.method.upper(),
+            'status': response.status_code,
+            'p50': round(percentile(timings, 50), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'queries': max(query_counts),
+        }
+
+    return results
+
+
+def compare(results, baseline, threshold=0.2, min_delta=1.0):
+    """The regressions of ``results`` against ``baseline``: endpoints
+    whose p95 grew by more than ``threshold`` (and ``min_delta`` ms,
+    below which differences are noise) or that run more queries.
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current['p95'] > before['p95'] * (1 + threshold) and \
+                current['p95'] - before['p95'] > min_delta:
+            regressions.append(
+                f'{name}: p95 {before["p95"]:.3f} -> '
+                f'{current["p95"]:.3f} ms')
+        if current['queries'] > before['queries']:
+            regressions.append(
+                f'{name}: {before["queries"]} -> '
+                f'{current["queries"]} queries')
+
+    return regressions
@@ -0,0 +1,147 @@
+"""Set-based writes that bypass per-object saves.
+
+Model signals do not fire for these writes, so every function here
+keeps the derived data those signals maintain up to date itself.
+"""
+import zlib
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models.functions import Lower
+
+from . import stats
+from .models import CollectionVersion, Ingredient, Recipe, RecipeStat, \
+    Tag
+
+RECIPE_RELATIONS = ('tags', 'ingredients')
+
+COLLECTIONS = {
+    Tag: CollectionVersion.TAG,
+    Ingredient: CollectionVersion.INGREDIENT,
+}
+
+
+def link_recipes(recipes, field, related_ids, batch_size=1000):
+    """Bulk insert the through rows linking each recipe to the ids at
+    the same position in ``related_ids``, and return them.
+    """
+    m2m = Recipe._meta.get_field(field)
+    through = m2m.remote_field.through
+    source = m2m.m2m_column_name()
+    target = m2m.m2m_reverse_name()
+
+    return through.objects.bulk_create(
+        [
+            through(**{source: recipe.pk, target: pk})
+            for recipe, ids in zip(recipes, related_ids)
+            for pk in dict.fromkeys(ids)
+        ],
+        batch_size=batch_size
+    )
+
+
+def create_recipes(user, items, batch_size=1000):
+    """Create a recipe for each validated item in a few statements.
+
+    Items hold Recipe field values, plus optional ``tags`` and
+    ``ingredients`` lists of ids owned by ``user``.
+    """
+    items = list(items)
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(user=user, **{
+                    name: value for name, value in item.items()
+                    if name not in RECIPE_RELATIONS
+                })
+                for item in items
+            ],
+            batch_size=batch_size
+        )
+        deltas = Counter()
+        for recipe in recipes:
+            deltas.update(
+                stats.recipe_deltas(recipe.price, recipe.time_minutes))
+        collections = [CollectionVersion.RECIPE]
+        for field in RECIPE_RELATIONS:
+            links = link_recipes(
+                recipes,
+                field,
+                [item.get(field, ()) for item in items],
+                batch_size=batch_size
+            )
+            if links:
+                target = Recipe._meta.get_field(field).m2m_reverse_name()
+                stats.add_usage(
+                    field, [getattr(link, target) for link in links])
+                collections.append(stats.RELATIONS[field][1])
+
+        if recipes:
+            RecipeStat.objects.add(user.pk, deltas)
+            CollectionVersion.objects.bump(user.pk, *collections)
+
+    return recipes
+
+
+def normalize_name(name):
+    """Collapse whitespace; names are compared case-insensitively."""
+    return ' '.join(name.split())
+
+
+def fold_case(names):
+    """``names`` lowercased by the database, whose ``lower()`` differs
+    from ``str.lower()`` for some characters and locales.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT lower(name) FROM unnest(%s::text[]) '
+            'WITH ORDINALITY AS names(name, position) ORDER BY position',
+            [list(names)]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def lock_user_rows(model, user):
+    """Serialize writers of the user's rows of ``model`` until the end
+    of the current transaction.
+    """
+    table_key = zlib.crc32(model._meta.db_table.encode()) - 2 ** 31
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)',
+                       [table_key, user.pk])
+
+
+def get_or_create_named(model, user, names):
+    """Return the user's ``model`` rows (tags or ingredients) named
+    ``names``, creating the missing ones, as a dict keyed by the given
+    names, and the list of the rows that were created.
+
+    Names are matched on their ``lower()`` in the database. Existing
+    names are found with one query and the missing ones inserted with
+    one statement. Callers for the same user, and the single creates of
+    the views, are serialized, so a name is never created twice.
+    """
+    names = list(names)
+    normalized = [normalize_name(name) for name in names]
+    keys = fold_case(normalized)
+    wanted = {}
+    for key, name in zip(keys, normalized):
+        wanted.setdefault(key, name)
+
+    with transaction.atomic():
+        lock_user_rows(model, user)
+
+        found = {}
+        for obj in model.objects.annotate(key=Lower('name')).filter(
+                user=user, key__in=list(wanted)).order_by('id'):
+            found.setdefault(obj.key, obj)
+
+        missing = [key for key in wanted if key not in found]
+        created = model.objects.bulk_create([
+            model(user=user, name=wanted[key]) for key in missing
+        ])
+        found.update(zip(missing, created))
+        if created:
+            CollectionVersion.objects.bump(user.pk, COLLECTIONS[model])
+
+    return {name: found[key] for name, key in zip(names, keys)}, created
@@ -0,0 +1,6 @@
+from django.db.models import Subquery
+
+
+class ArraySubquery(Subquery):
+    """The rows of a single column subquery as an array."""
+    template = 'ARRAY(%(subquery)s)'
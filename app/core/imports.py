@@ -0,0 +1,134 @@
+"""Imports of recipes in the formats of core.exports.
+
+The file is read as a stream, one record at a time. Valid records are
+collected into batches; the tag and ingredient names of a batch are
+resolved (and the missing ones created) with one query each, and its
+recipes and their through rows are inserted with a few bulk statements.
+Progress and the errors of invalid records are reported as events while
+the import runs, so nothing grows with the size of the file.
+"""
+import csv
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import bulk
+from .exports import CSV
+from .models import Ingredient, Recipe, Tag
+
+FIELDS = ('title', 'time_minutes', 'price', 'link')
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+def read_ndjson(file):
+    """Yield ``(line number, record or None)`` for each line of the
+    binary ``file``; None stands for a line that is not a JSON object.
+    """
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+def read_csv(file):
+    """Yield ``(line number, record or None)`` for each row of the
+    binary CSV ``file``. Name lists are JSON arrays.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(file, 'utf-8', newline=''))
+    try:
+        for row in reader:
+            try:
+                for name in RELATIONS:
+                    if row.get(name):
+                        row[name] = json.loads(row[name])
+            except ValueError:
+                row = None
+            yield reader.line_num, row
+    except (csv.Error, UnicodeDecodeError):
+        yield reader.line_num + 1, None
+
+
+def read(file, fmt):
+    return read_csv(file) if fmt == CSV else read_ndjson(file)
+
+
+def clean(record):
+    """Return the recipe fields of ``record`` and a dict of errors."""
+    item, errors = {}, {}
+    for name in FIELDS:
+        field = Recipe._meta.get_field(name)
+        value = record.get(name)
+        if value in (None, '') and field.blank:
+            item[name] = field.get_default()
+            continue
+        try:
+            item[name] = field.clean(value, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+
+    for name in RELATIONS:
+        names = record.get(name) or []
+        if not isinstance(names, list) or not all(
+                isinstance(n, str) and 0 < len(bulk.normalize_name(n)) <= 255
+                for n in names):
+            errors[name] = ['Expected a list of names.']
+        else:
+            item[name] = names
+
+    return item, errors
+
+
+def import_batch(user, items):
+    """Create the recipes of ``items``, whose relations are lists of
+    names, creating the missing tags and ingredients.
+    """
+    with transaction.atomic():
+        for name, model in RELATIONS.items():
+            names = {n for item in items for n in item[name]}
+            objects = bulk.get_or_create_named(model, user, names)[0] \
+                if names else {}
+            for item in items:
+                item[name] = [objects[n].pk for n in item[name]]
+
+        return bulk.create_recipes(user, items)
+
+
+def import_recipes(user, records, batch_size=1000):
+    """Import ``(line number, record)`` pairs for ``user``, yielding
+    events: ``{'line', 'errors'}`` for each invalid record,
+    ``{'processed', 'created', 'failed'}`` after each batch, and that
+    summary again with ``'done': True`` at the end.
+    """
+    summary = {'processed': 0, 'created': 0, 'failed': 0}
+    batch = []
+
+    def flush():
+        summary['created'] += len(import_batch(user, batch))
+        batch.clear()
+        return dict(summary)
+
+    for number, record in records:
+        summary['processed'] += 1
+        if record is None:
+            item, errors = None, {'non_field_errors': ['Malformed record.']}
+        else:
+            item, errors = clean(record)
+
+        if errors:
+            summary['failed'] += 1
+            yield {'line': number, 'errors': errors}
+            continue
+
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield flush()
+
+    if batch:
+        yield flush()
+    yield dict(summary, done=True)
@@ -0,0 +1,112 @@
+import json
+import shutil
+import tempfile
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+
+from core import benchmark, synthetic
+
+DATASET = ('users', 'recipes', 'tags', 'ingredients', 'links', 'requests')
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset and report the p50/p95/p99 latency '
+            'and the query count of every API endpoint as JSON, '
+            'optionally compared with the report of an earlier run. All '
+            'data is rolled back when the command finishes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='Recipes per user.')
+        parser.add_argument('--tags', type=int, default=50,
+                            help='Tags per user.')
+        parser.add_argument('--ingredients', type=int, default=100,
+                            help='Ingredients per user.')
+        parser.add_argument('--links', type=int, default=3,
+                            help='Tags and ingredients per recipe.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Timed requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Untimed requests per endpoint.')
+        parser.add_argument('--endpoints', nargs='+',
+                            help='Names of the endpoints to run (all by '
+                                 'default).')
+        parser.add_argument('--output', help='Write the report to a file.')
+        parser.add_argument(
+            '--compare',
+            help='Report of an earlier run on the same dataset; fail if '
+                 'an endpoint regressed.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Relative p95 increase counted as a regression.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            mismatch = [
+                name for name in DATASET
+                if baseline['dataset'].get(name) != options[name]
+            ]
+            if mismatch:
+                raise CommandError(
+                    f'The baseline was run with other {", ".join(mismatch)}.')
+
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root), \
+                    transaction.atomic(), connection.cursor() as cursor:
+                self.stderr.write('Seeding...')
+                started = time.perf_counter()
+                user_ids = synthetic.seed(
+                    cursor,
+                    users=options['users'],
+                    tags=options['tags'],
+                    ingredients=options['ingredients'],
+                    recipes=options['recipes'],
+                    links=options['links'],
+                )
+                cursor.execute('ANALYZE')
+                self.stderr.write(
+                    f'Seeded in {time.perf_counter() - started:.1f}s')
+
+                results = benchmark.run(
+                    user_ids[len(user_ids) // 2],
+                    options['requests'],
+                    options['warmup'],
+                    only=options['endpoints'],
+                )
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        failed = [
+            f'{name}: {result["status"]}'
+            for name, result in results.items() if result['status'] >= 400
+        ]
+        if failed:
+            raise CommandError(
+                'Requests failed: ' + ', '.join(failed))
+
+        report = json.dumps({
+            'dataset': {name: options[name] for name in DATASET},
+            'endpoints': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+        if baseline is not None:
+            regressions = benchmark.compare(
+                results, baseline['endpoints'], options['threshold'])
+            if regressions:
+                raise CommandError(
+                    'Regressions:\n' + '\n'.join(regressions))
+            self.stderr.write('No regressions.')
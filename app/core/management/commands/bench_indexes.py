@@ -0,0 +1,110 @@
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from core import synthetic
+from core.models import Ingredient, Recipe, Tag
+
+INDEXES = (
+    'core_tag_user_name_idx',
+    'core_ingredient_user_name_idx',
+    'core_recipe_user_id_idx',
+    'core_recipe_user_price_idx',
+    'core_recipe_user_time_idx',
+    'core_recipe_tags_tag_recipe_idx',
+    'core_recipe_ingredients_ingredient_recipe_idx',
+)
+
+
+def access_patterns(user_id, tag_id, ingredient_id, page_size):
+    """The per-user queries issued by the recipe API."""
+    return {
+        'tag list': Tag.objects.filter(
+            user_id=user_id).order_by('-name')[:page_size],
+        'ingredient list': Ingredient.objects.filter(
+            user_id=user_id).order_by('-name')[:page_size],
+        'recipe list': Recipe.objects.filter(
+            user_id=user_id).order_by('-id')[:page_size],
+        'cheapest recipes': Recipe.objects.filter(
+            user_id=user_id, time_minutes__lte=30
+        ).order_by('price', 'id')[:page_size],
+        'quickest recipes': Recipe.objects.filter(
+            user_id=user_id, price__lte=10
+        ).order_by('time_minutes', 'id')[:page_size],
+        'recipes by tag': Recipe.tags.through.objects.filter(
+            tag_id=tag_id).values('recipe_id'),
+        'recipes by ingredient': Recipe.ingredients.through.objects.filter(
+            ingredient_id=ingredient_id).values('recipe_id'),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset and compare query plans and latency '
+            'with and without the per-user composite indexes. All data is '
+            'rolled back when the command finishes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=20000,
+                            help='Recipes per user.')
+        parser.add_argument('--tags', type=int, default=200,
+                            help='Tags per user.')
+        parser.add_argument('--ingredients', type=int, default=500,
+                            help='Ingredients per user.')
+        parser.add_argument('--links', type=int, default=3,
+                            help='Tags and ingredients per recipe.')
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=101)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.stdout.write('Seeding...')
+            started = time.perf_counter()
+            user_ids = synthetic.seed(
+                cursor,
+                users=options['users'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                recipes=options['recipes'],
+                links=options['links'],
+            )
+            cursor.execute('ANALYZE')
+            self.stdout.write(
+                f'Seeded in {time.perf_counter() - started:.1f}s')
+
+            user_id = user_ids[len(user_ids) // 2]
+            queries = access_patterns(
+                user_id,
+                Tag.objects.filter(user_id=user_id).values_list(
+                    'id', flat=True).first(),
+                Ingredient.objects.filter(user_id=user_id).values_list(
+                    'id', flat=True).first(),
+                options['page_size'],
+            )
+
+            self.report(cursor, 'with indexes', queries, options['runs'])
+            for index in INDEXES:
+                cursor.execute(f'DROP INDEX {index}')
+            self.report(cursor, 'without indexes', queries, options['runs'])
+
+            transaction.set_rollback(True)
+
+    def report(self, cursor, label, queries, runs):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {label} =='))
+        for name, queryset in queries.items():
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            plan = '\n'.join(f'    {row[0]}' for row in cursor.fetchall())
+
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(
+                f'{name}: median {statistics.median(timings):.3f} ms')
+            self.stdout.write(plan)
@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connections
+
+from core import exports
+
+
+def export_user(user_id, output_dir, fmt):
+    """Write the exports of one user to ``<output_dir>/<user id>/``."""
+    directory = os.path.join(output_dir, str(user_id))
+    os.makedirs(directory, exist_ok=True)
+    for model in exports.COLUMNS:
+        path = os.path.join(directory, exports.filename(model, fmt))
+        with open(path, 'wb') as f:
+            exports.write(model, user_id, fmt, f)
+
+    return user_id
+
+
+class Command(BaseCommand):
+    help = ("Export every user's recipes, tags and ingredients to files, "
+            'exporting users in parallel worker processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir')
+        parser.add_argument('--format', dest='fmt', default=exports.NDJSON,
+                            choices=list(exports.FORMATS))
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes; 1 exports in-process.')
+        parser.add_argument('--users', type=int, nargs='+',
+                            help='Only export these user ids.')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id')
+        if options['users']:
+            users = users.filter(pk__in=options['users'])
+        user_ids = list(users.values_list('id', flat=True))
+        args = (repeat(options['output_dir']), repeat(options['fmt']))
+
+        if options['workers'] == 1:
+            self.report(map(export_user, user_ids, *args))
+        else:
+            # Forked workers must open their own database connections.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as executor:
+                self.report(executor.map(export_user, user_ids, *args))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {len(user_ids)} users to {options["output_dir"]}'))
+
+    def report(self, exported):
+        for user_id in exported:
+            self.stdout.write(f'Exported user {user_id}')
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core.storage import collect_garbage
+
+
+class Command(BaseCommand):
+    help = ('Delete the stored recipe images, and their renditions, that '
+            'no recipe references any more.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.IMAGE_BLOB_GC_GRACE,
+            help='Only delete images unreferenced for this many seconds.')
+
+    def handle(self, *args, **options):
+        deleted = collect_garbage(timedelta(seconds=options['grace']))
+        self.stdout.write(f'Deleted {deleted} unreferenced images.')
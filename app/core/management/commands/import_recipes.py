@@ -0,0 +1,40 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from core import exports, imports
+
+
+class Command(BaseCommand):
+    help = ('Import recipes for a user from an NDJSON or CSV file in the '
+            'format of the exports, reporting progress and invalid lines.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the importing user.')
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='fmt', choices=list(
+            exports.FORMATS), help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}.')
+
+        fmt = options['fmt'] or (
+            exports.CSV if options['path'].lower().endswith('.csv')
+            else exports.NDJSON)
+
+        with open(options['path'], 'rb') as f:
+            for event in imports.import_recipes(
+                    user, imports.read(f, fmt), options['batch_size']):
+                if 'errors' in event:
+                    self.stderr.write(
+                        f'Line {event["line"]}: {json.dumps(event["errors"])}')
+                else:
+                    self.stdout.write(
+                        f'{event["processed"]} processed, '
+                        f'{event["created"]} created, '
+                        f'{event["failed"]} failed')
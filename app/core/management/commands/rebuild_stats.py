@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from core import stats
+
+
+class Command(BaseCommand):
+    help = ('Recompute the library statistics and the usage of tags and '
+            'ingredients from the recipes, to repair drift from writes '
+            'that bypassed the model signals.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, nargs='+',
+            help='Ids of the users to rebuild (all by default).')
+
+    def handle(self, *args, **options):
+        rows, corrected = stats.rebuild(options['users'])
+        self.stdout.write(f'Rebuilt {rows} statistics rows, corrected '
+                          f'{corrected} usage counters.')
@@ -1,5 +1,7 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.core.validators import validate_email
+from django.db import connection, models
+from django.db.models.functions import Now
 
 
 class UserManager(BaseUserManager):
@@ -18,3 +20,90 @@ class UserManager(BaseUserManager):
         user.save()
 
         return user
+
+
+class CollectionVersionManager(models.Manager):
+    def current(self, user, collection):
+        """Return the (version, modified) pair of a user's collection,
+        or (0, None) if it was never written to.
+        """
+        try:
+            return self.filter(
+                user=user, collection=collection
+            ).values_list('version', 'modified').get()
+        except self.model.DoesNotExist:
+            return 0, None
+
+    def bump(self, user_id, *collections):
+        """Atomically increment the version of each of the user's
+        collections, creating missing rows.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                '(user_id, collection, version, modified) '
+                'SELECT %s, c, 1, now() FROM unnest(%s::varchar[]) c '
+                'ON CONFLICT (user_id, collection) DO UPDATE '
+                'SET version = EXCLUDED.version + '
+                f'{self.model._meta.db_table}.version, '
+                'modified = EXCLUDED.modified',
+                [user_id, list(collections)]
+            )
+
+
+class ImageBlobManager(models.Manager):
+    def _add(self, name, refs):
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, refcount, modified) '
+                'VALUES (%s, %s, now()) '
+                'ON CONFLICT (name) DO UPDATE '
+                f'SET refcount = EXCLUDED.refcount + {table}.refcount, '
+                'modified = EXCLUDED.modified',
+                [name, refs]
+            )
+
+    def touch(self, name):
+        """Record that ``name`` was just stored, so it is not collected
+        before the recipe referencing it is saved.
+        """
+        self._add(name, 0)
+
+    def acquire(self, name):
+        self._add(name, 1)
+
+    def release(self, name):
+        self.filter(name=name, refcount__gt=0).update(
+            refcount=models.F('refcount') - 1, modified=Now())
+
+
+class RecipeStatManager(models.Manager):
+    def add(self, user_id, deltas):
+        """Add the ``{(kind, key): delta}`` counts to the user's rows,
+        creating missing ones, and drop the rows that reach zero.
+        """
+        deltas = sorted(
+            (kind, key, delta) for (kind, key), delta in deltas.items()
+            if delta
+        )
+        if not deltas:
+            return
+
+        table = self.model._meta.db_table
+        kinds, keys, counts = zip(*deltas)
+        with connection.cursor() as cursor:
+            # Rows are locked in (kind, key) order, so that concurrent
+            # writers of the same user can't deadlock.
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, kind, key, count) '
+                'SELECT %s, d.kind, d.key, d.count '
+                'FROM unnest(%s::varchar[], %s::bigint[], %s::int[]) '
+                '  AS d(kind, key, count) '
+                'ORDER BY d.kind, d.key '
+                'ON CONFLICT (user_id, kind, key) DO UPDATE '
+                f'SET count = EXCLUDED.count + {table}.count',
+                [user_id, list(kinds), list(keys), list(counts)]
+            )
+        if any(count < 0 for count in counts):
+            self.filter(user_id=user_id, count__lte=0).delete()
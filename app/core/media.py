@@ -0,0 +1,154 @@
+"""Serving of uploaded media.
+
+With ``MEDIA_SERVE_MODE`` set to ``'x-accel'`` (nginx) or
+``'x-sendfile'`` (Apache, lighttpd) the view only checks the path and
+hands the file over to the front proxy, so no image bytes pass through
+the application. The ``'python'`` mode streams the file itself with a
+``FileResponse``, which WSGI servers offering ``wsgi.file_wrapper``
+(such as gunicorn) send with ``sendfile()``.
+
+Uploaded file names embed a uuid or a content hash and are never
+rewritten, so they are served as immutable.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+X_ACCEL = 'x-accel'
+X_SENDFILE = 'x-sendfile'
+PYTHON = 'python'
+
+IMMUTABLE_NAME = re.compile(
+    r'(?:[0-9a-f]{8}-(?:[0-9a-f]{4}-){3}[0-9a-f]{12}|[0-9a-f]{64})'
+    r'(?:_\w+)?\.\w+$'
+)
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """A read-only view of ``length`` bytes of ``file`` from ``start``.
+
+    The underlying file is positioned at ``start``, so servers sending
+    it with ``sendfile()`` from its file descriptor and the response's
+    Content-Length send exactly the range.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return the ``(start, end)`` of a single byte range, inclusive,
+    ``None`` for ranges that are not supported, or raise ValueError if
+    the range cannot be satisfied.
+    """
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def cache_control(path):
+    if IMMUTABLE_NAME.search(os.path.basename(path)):
+        return (f'public, max-age={settings.MEDIA_IMMUTABLE_MAX_AGE}, '
+                'immutable')
+    return 'public, no-cache'
+
+
+@require_safe
+def serve(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    stat = os.stat(fullpath)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, path, fullpath, stat.st_size,
+                                  (etag, http_date(last_modified)))
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control(path)
+    return response
+
+
+def _file_response(request, path, fullpath, size, validators):
+    mode = settings.MEDIA_SERVE_MODE
+    if mode in (X_ACCEL, X_SENDFILE):
+        # The proxy answers Range requests itself.
+        response = HttpResponse(content_type=_content_type(fullpath))
+        if mode == X_ACCEL:
+            response['X-Accel-Redirect'] = quote(
+                settings.MEDIA_ACCEL_REDIRECT_PREFIX + path)
+        else:
+            response['X-Sendfile'] = fullpath
+        return response
+
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (if_range is None or if_range in validators):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(file)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1),
+                                status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+        response['Content-Type'] = _content_type(fullpath)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _content_type(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
@@ -0,0 +1,361 @@
+"""Process metrics in the Prometheus text format.
+
+Counters and fixed-bucket histograms keep their values in a store. By
+default it is a dict local to the process. With ``METRICS_DIR`` set, each
+process keeps its values in its own memory-mapped file in that directory
+instead, and the values of every file are added up when the metrics are
+collected, so that any worker can answer for all of them. Files of exited
+workers keep counting towards the totals; the directory should be emptied
+when the server starts.
+
+MetricsMiddleware records each request, by route, method and status,
+with the query count and time measured by core.timing. The metrics are
+served by ``view``, to the holders of METRICS_TOKEN only.
+"""
+import bisect
+import glob
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework.authentication import get_authorization_header
+
+from .timing import get_timing
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+# Bytes.
+SIZE_BUCKETS = tuple(2 ** n for n in range(16, 27, 2))
+
+
+class LocalValues:
+    """Values of the current process, in a dict."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class FileValues:
+    """Values of the current process, in a memory-mapped file of
+    ``directory``, and the sums of all the files of the directory.
+
+    A file holds the number of bytes in use, then the entries: a key
+    length, the key padded to 8 bytes and the value as a double. An
+    entry is written before the used size is increased, so other
+    processes can read the file at any time.
+    """
+    HEADER = struct.Struct('Q')
+    LENGTH = struct.Struct('I')
+    VALUE = struct.Struct('d')
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _open(self):
+        # Also after a fork: the child must not write to the parent's file.
+        self._pid = os.getpid()
+        self._file = open(os.path.join(
+            self.directory, f'metrics_{self._pid}.db'), 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self.INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._positions = {}
+        self._used = self.HEADER.unpack_from(self._map)[0] or \
+            self.HEADER.size
+        for key, position in self.entries(self._map, self._used):
+            self._positions[key] = position
+
+    @classmethod
+    def entries(cls, data, used):
+        """Yield the ``(key, value position)`` of the entries."""
+        position = cls.HEADER.size
+        while position < used:
+            length = cls.LENGTH.unpack_from(data, position)[0]
+            start = position + cls.LENGTH.size
+            value_position = start + length + (-start - length) % 8
+            yield data[start:start + length].decode(), value_position
+            position = value_position + cls.VALUE.size
+
+    def _append(self, key):
+        encoded = key.encode()
+        start = self._used + self.LENGTH.size
+        position = start + len(encoded) + (-start - len(encoded)) % 8
+        end = position + self.VALUE.size
+        if end > len(self._map):
+            size = len(self._map)
+            while size < end:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+
+        self.LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[start:start + len(encoded)] = encoded
+        self.VALUE.pack_into(self._map, position, 0.0)
+        self.HEADER.pack_into(self._map, 0, end)
+        self._used = end
+        self._positions[key] = position
+        return position
+
+    def inc(self, key, amount):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = self.VALUE.unpack_from(self._map, position)[0]
+            self.VALUE.pack_into(self._map, position, value + amount)
+
+    def collect(self):
+        values = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+            with open(path, 'rb') as file:
+                data = file.read()
+            if len(data) < self.HEADER.size:
+                continue
+            used = min(self.HEADER.unpack_from(data)[0], len(data))
+            for key, position in self.entries(data, used):
+                values[key] = values.get(key, 0.0) + \
+                    self.VALUE.unpack_from(data, position)[0]
+        return values
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    @property
+    def family(self):
+        """The name of the samples in the HELP and TYPE lines."""
+        return self.name
+
+    def key(self, suffix, labels, **extra):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f'{self.name} expects the labels {self.labelnames}.')
+        return json.dumps([self.name + suffix, dict(labels, **extra)],
+                          sort_keys=True)
+
+    def samples(self, values):
+        """The ``(name, labels, value)`` of the metric in ``values``."""
+        for (name, labels), value in values:
+            yield name, labels, value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    @property
+    def family(self):
+        return f'{self.name}_total'
+
+    def inc(self, amount=1, **labels):
+        self.registry.values.inc(self.key('_total', labels), amount)
+
+
+class Histogram(Metric):
+    """A histogram over fixed upper bounds ``buckets``. Each bucket
+    is stored with its own count; they are made cumulative on output.
+    """
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        index = bisect.bisect_left(self.buckets, value)
+        bound = self.buckets[index] if index < len(self.buckets) else '+Inf'
+        values = self.registry.values
+        values.inc(self.key('_bucket', labels, le=str(bound)), 1)
+        values.inc(self.key('_sum', labels), value)
+        values.inc(self.key('_count', labels), 1)
+
+    def samples(self, values):
+        series = {}
+        for (name, labels), value in values:
+            bound = labels.pop('le', None)
+            entry = series.setdefault(
+                tuple(sorted(labels.items())), {'buckets': {}})
+            if bound is None:
+                entry[name] = value
+            else:
+                entry['buckets'][bound] = value
+
+        for labels, entry in sorted(series.items()):
+            labels = dict(labels)
+            cumulative = 0.0
+            for bound in (*map(str, self.buckets), '+Inf'):
+                cumulative += entry['buckets'].get(bound, 0.0)
+                yield f'{self.name}_bucket', dict(labels, le=bound), \
+                    cumulative
+            yield f'{self.name}_sum', labels, entry.get(
+                f'{self.name}_sum', 0.0)
+            yield f'{self.name}_count', labels, entry.get(
+                f'{self.name}_count', 0.0)
+
+
+def _format_value(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace(
+        '\n', r'\n').replace('"', r'\"')
+
+
+class Registry:
+    """The metrics of the application and the store of their values."""
+
+    def __init__(self, values=None):
+        self.metrics = {}
+        self._values = values
+
+    @property
+    def values(self):
+        if self._values is None:
+            directory = getattr(settings, 'METRICS_DIR', None)
+            self._values = FileValues(directory) if directory \
+                else LocalValues()
+        return self._values
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(
+            Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=LATENCY_BUCKETS):
+        return self.register(
+            Histogram(self, name, documentation, labelnames, buckets))
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        by_metric = {}
+        for key, value in self.values.collect().items():
+            name, labels = json.loads(key)
+            by_metric.setdefault(name, []).append(((name, labels), value))
+
+        lines = []
+        for metric in sorted(self.metrics.values(), key=lambda m: m.name):
+            lines.append(f'# HELP {metric.family} {metric.documentation}')
+            lines.append(f'# TYPE {metric.family} {metric.type}')
+            values = sorted(
+                (item for suffix in ('_total', '_bucket', '_sum', '_count')
+                 for item in by_metric.get(metric.name + suffix, ())),
+                key=lambda item: json.dumps(item[0], sort_keys=True)
+            )
+            for name, labels, value in metric.samples(values):
+                label_text = ','.join(
+                    f'{label}="{_escape(labels[label])}"'
+                    for label in sorted(
+                        labels, key=lambda label: (label == 'le', label)))
+                lines.append(
+                    f'{name}{{{label_text}}} {_format_value(value)}'
+                    if label_text else f'{name} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    'http_requests', 'Requests by route, method and status.',
+    ('route', 'method', 'status'))
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds',
+    'Request latency by route, method and status.',
+    ('route', 'method', 'status'))
+REQUEST_DB_DURATION = registry.histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in SQL queries per request, by route.', ('route', ))
+DB_QUERIES = registry.counter(
+    'db_queries', 'SQL queries run by requests, by route.', ('route', ))
+TOKEN_CACHE_LOOKUPS = registry.counter(
+    'token_cache_lookups',
+    'Lookups of the token authentication cache, by result (hit or miss).',
+    ('result', ))
+IMAGE_UPLOAD_SIZE = registry.histogram(
+    'image_upload_size_bytes', 'Size of the uploaded recipe images.',
+    buckets=SIZE_BUCKETS)
+
+
+def route(request):
+    """The URL pattern name of the request; a bounded label."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    """Record each request. Should come right after
+    core.timing.ServerTimingMiddleware, whose query timing it reuses.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        labels = {
+            'route': route(request),
+            'method': request.method,
+            'status': str(response.status_code),
+        }
+        REQUESTS.inc(**labels)
+        REQUEST_DURATION.observe(duration, **labels)
+
+        timing = get_timing(request)
+        if timing is not None:
+            DB_QUERIES.inc(timing.queries, route=labels['route'])
+            REQUEST_DB_DURATION.observe(
+                timing.db / 1000, route=labels['route'])
+
+        return response
+
+
+def view(request):
+    """Serve the metrics to scrapers presenting METRICS_TOKEN as a
+    bearer token. Without a configured token the endpoint is disabled.
+    The client address is not trusted: behind a local proxy every
+    request comes from the loopback interface.
+    """
+    expected = settings.METRICS_TOKEN
+    auth = get_authorization_header(request).split()
+    if not expected or len(auth) != 2 or auth[0].lower() != b'bearer' or \
+            not hmac.compare_digest(auth[1], expected.encode()):
+        raise Http404
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.3 on 2026-10-18 05:23
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    """Create the blobs of the images uploaded so far."""
+    Recipe = apps.get_model('core', 'Recipe')
+    ImageBlob = apps.get_model('core', 'ImageBlob')
+    references = Recipe.objects.exclude(image__isnull=True).exclude(
+        image='').values('image').annotate(refcount=models.Count('id'))
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=row['image'], refcount=row['refcount'])
+         for row in references.order_by().iterator()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 2.2.3 on 2026-10-18 05:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# search_vector holds the title (weight A), tag names (B) and ingredient
+# names (C) of a recipe. It is computed when a recipe is inserted or its
+# title changes, and recomputed for the recipes affected by a statement
+# linking or unlinking tags or ingredients, or renaming them.
+SEARCH_SQL = """
+CREATE FUNCTION core_recipe_search_document(integer, text)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('english', $2), 'A')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(t.name, ' ')
+            FROM core_recipe_tags rt JOIN core_tag t ON t.id = rt.tag_id
+            WHERE rt.recipe_id = $1), '')), 'B')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM core_recipe_ingredients ri
+            JOIN core_ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = $1), '')), 'C')
+$$;
+
+CREATE FUNCTION core_recipe_search_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := core_recipe_search_document(NEW.id, NEW.title);
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER core_recipe_search_update
+BEFORE INSERT OR UPDATE OF title ON core_recipe
+FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_update();
+
+CREATE FUNCTION core_recipe_relations_search_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_document(r.id, r.title)
+    WHERE r.id IN (SELECT recipe_id FROM changed);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_recipe_tags_search_insert
+AFTER INSERT ON core_recipe_tags REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_relations_search_update();
+CREATE TRIGGER core_recipe_tags_search_delete
+AFTER DELETE ON core_recipe_tags REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_relations_search_update();
+CREATE TRIGGER core_recipe_ingredients_search_insert
+AFTER INSERT ON core_recipe_ingredients REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_relations_search_update();
+CREATE TRIGGER core_recipe_ingredients_search_delete
+AFTER DELETE ON core_recipe_ingredients REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_relations_search_update();
+
+CREATE FUNCTION core_tag_search_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_document(r.id, r.title)
+    WHERE r.id IN (
+        SELECT rt.recipe_id FROM core_recipe_tags rt
+        JOIN new_rows n ON n.id = rt.tag_id
+        JOIN old_rows o ON o.id = n.id
+        WHERE o.name IS DISTINCT FROM n.name);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_tag_search_update
+AFTER UPDATE ON core_tag
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE core_tag_search_update();
+
+CREATE FUNCTION core_ingredient_search_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_document(r.id, r.title)
+    WHERE r.id IN (
+        SELECT ri.recipe_id FROM core_recipe_ingredients ri
+        JOIN new_rows n ON n.id = ri.ingredient_id
+        JOIN old_rows o ON o.id = n.id
+        WHERE o.name IS DISTINCT FROM n.name);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_ingredient_search_update
+AFTER UPDATE ON core_ingredient
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE core_ingredient_search_update();
+
+UPDATE core_recipe SET search_vector = core_recipe_search_document(id, title);
+"""
+
+REVERSE_SEARCH_SQL = """
+DROP TRIGGER core_ingredient_search_update ON core_ingredient;
+DROP FUNCTION core_ingredient_search_update();
+DROP TRIGGER core_tag_search_update ON core_tag;
+DROP FUNCTION core_tag_search_update();
+DROP TRIGGER core_recipe_ingredients_search_delete ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_ingredients_search_insert ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_tags_search_delete ON core_recipe_tags;
+DROP TRIGGER core_recipe_tags_search_insert ON core_recipe_tags;
+DROP FUNCTION core_recipe_relations_search_update();
+DROP TRIGGER core_recipe_search_update ON core_recipe;
+DROP FUNCTION core_recipe_search_update();
+DROP FUNCTION core_recipe_search_document(integer, text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_imageblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search_idx'),
+        ),
+        migrations.RunSQL(SEARCH_SQL, REVERSE_SEARCH_SQL),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_search_vector'),
+    ]
+
+    # Case-insensitive prefix lookups (LIKE 'abc%') on the user's names.
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX core_tag_user_name_prefix_idx '
+            'ON core_tag (user_id, lower(name) text_pattern_ops);',
+            'DROP INDEX core_tag_user_name_prefix_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_ingredient_user_name_prefix_idx '
+            'ON core_ingredient (user_id, lower(name) text_pattern_ops);',
+            'DROP INDEX core_ingredient_user_name_prefix_idx;',
+        ),
+    ]
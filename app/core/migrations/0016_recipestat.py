@@ -0,0 +1,47 @@
+# Generated by Django 2.2.3 on 2026-10-18 05:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_recipes(apps, schema_editor):
+    """Create the statistics of the existing recipes."""
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeStat = apps.get_model('core', 'RecipeStat')
+    counts = [
+        ('price', Recipe.objects.values_list(
+            'user_id', models.F('price') * 100)),
+        ('time', Recipe.objects.values_list('user_id', 'time_minutes')),
+    ]
+    for kind, rows in counts:
+        RecipeStat.objects.bulk_create(
+            [RecipeStat(user_id=user_id, kind=kind, key=key, count=count)
+             for user_id, key, count in rows.annotate(
+                 count=models.Count('*')).order_by().iterator()],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_name_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('key', models.BigIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'kind', 'key')},
+            },
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
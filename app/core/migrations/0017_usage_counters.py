@@ -0,0 +1,45 @@
+# Generated by Django 2.2.3 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipestat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='usage',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='usage',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            'UPDATE core_tag o SET usage = c.n FROM ('
+            '  SELECT tag_id, count(*) AS n FROM core_recipe_tags '
+            '  GROUP BY tag_id'
+            ') c WHERE o.id = c.tag_id',
+            migrations.RunSQL.noop
+        ),
+        migrations.RunSQL(
+            'UPDATE core_ingredient o SET usage = c.n FROM ('
+            '  SELECT ingredient_id, count(*) AS n '
+            '  FROM core_recipe_ingredients GROUP BY ingredient_id'
+            ') c WHERE o.id = c.ingredient_id',
+            migrations.RunSQL.noop
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-usage', '-id'], name='core_ingredient_user_usage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-usage', '-id'], name='core_tag_user_usage_idx'),
+        ),
+    ]
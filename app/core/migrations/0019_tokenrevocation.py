@@ -0,0 +1,23 @@
+# Generated by Django 2.2.3 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_price_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenRevocation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('refresh_id', models.IntegerField(null=True)),
+                ('not_before', models.IntegerField(null=True)),
+                ('expires', models.IntegerField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,10 +1,16 @@
+import binascii
 import uuid
 import os
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
-from .managers import UserManager
+from .managers import CollectionVersionManager, ImageBlobManager, \
+    RecipeStatManager, UserManager
+from .storage import ContentAddressedStorage
 
 
 def recipe_image_file_path(instance, filename):
@@ -25,7 +31,26 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
-class Tag(models.Model):
+class RecipeAttr(models.Model):
+    """Base of the objects recipes are tagged with."""
+    # Number of recipes using it, kept up to date with atomic updates on
+    # every write to the recipe relations (see core.stats).
+    usage = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # Never write back a usage read before a concurrent update.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'usage'
+            ]
+        return super().save(*args, **kwargs)
+
+
+class Tag(RecipeAttr):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -33,11 +58,19 @@ class Tag(models.Model):
         related_name='tags'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'],
+                         name='core_tag_user_name_idx'),
+            models.Index(fields=['user', '-usage', '-id'],
+                         name='core_tag_user_usage_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(RecipeAttr):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -45,20 +78,147 @@ class Ingredient(models.Model):
         related_name='ingredients'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'],
+                         name='core_ingredient_user_name_idx'),
+            models.Index(fields=['user', '-usage', '-id'],
+                         name='core_ingredient_user_usage_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
 class Recipe(models.Model):
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+    # Text search configuration of search_vector, which is maintained by
+    # database triggers from the title, tag names and ingredient names.
+    SEARCH_CONFIG = 'english'
+
+    # Lookups by user are served by the composite indexes below.
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=8, decimal_places=2)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     link = models.CharField(max_length=255, blank=True)
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path,
+                              storage=ContentAddressedStorage())
+    image_status = models.CharField(max_length=16, blank=True,
+                                    choices=IMAGE_STATUSES)
+    image_renditions = JSONField(default=dict, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='core_recipe_user_id_idx'),
+            models.Index(fields=['user', 'price', 'id'],
+                         name='core_recipe_user_price_idx'),
+            models.Index(fields=['user', 'time_minutes', 'id'],
+                         name='core_recipe_user_time_idx'),
+            GinIndex(fields=['search_vector'],
+                     name='core_recipe_search_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class CollectionVersion(models.Model):
+    """Per-user version of a collection, bumped on every write to it.
+    Used as the validator for conditional GETs of the collection.
+    """
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    collection = models.CharField(max_length=32)
+    version = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = CollectionVersionManager()
+
+    class Meta:
+        unique_together = ('user', 'collection')
+
+
+class RefreshToken(models.Model):
+    """Long-lived token that can be exchanged for signed access tokens.
+    Its id identifies the access tokens issued from it, so they can be
+    revoked together.
+    """
+    key = models.CharField(max_length=40, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='refresh_tokens'
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = binascii.hexlify(os.urandom(20)).decode()
+        return super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.key
+
+
+class TokenRevocation(models.Model):
+    """An entry of the access token deny-list (see user.tokens).
+
+    It denies the access tokens issued from the refresh token
+    ``refresh_id`` or, with ``not_before``, every access token issued
+    to the user until then. The user is not a foreign key, as the
+    entries of deleted users must stay. Entries are deleted once the
+    tokens they deny have expired.
+    """
+    user_id = models.IntegerField()
+    refresh_id = models.IntegerField(null=True)
+    not_before = models.IntegerField(null=True)
+    expires = models.IntegerField(db_index=True)
+
+
+class ImageBlob(models.Model):
+    """A stored image and the number of recipes referencing it."""
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = ImageBlobManager()
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeStat(models.Model):
+    """Number of a user's recipes per price (in cents) and per cooking
+    time. Kept up to date on every write to the recipes, so the library
+    statistics are read from these few rows (see core.stats).
+    """
+    PRICE = 'price'
+    TIME = 'time'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    kind = models.CharField(max_length=16)
+    key = models.BigIntegerField()
+    count = models.IntegerField(default=0)
+
+    objects = RecipeStatManager()
+
+    class Meta:
+        unique_together = ('user', 'kind', 'key')
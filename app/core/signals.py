@@ -0,0 +1,186 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, \
+    post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import stats
+from .models import CollectionVersion, ImageBlob, Ingredient, Recipe, \
+    RecipeStat, Tag
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    CollectionVersion.objects.bump(instance.user_id, CollectionVersion.RECIPE)
+
+
+# Each recipe holds a reference to the blob of its image. The saved image
+# name is remembered on load, to tell when the image is replaced. It is
+# read from __dict__, so instances loaded without the field don't fetch
+# it unless they are saved or deleted.
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance._saved_image = None
+    elif 'image' in instance.__dict__:
+        value = instance.__dict__['image']
+        instance._saved_image = getattr(value, 'name', value) or None
+
+
+def saved_image(instance):
+    if not hasattr(instance, '_saved_image'):
+        instance._saved_image = Recipe.objects.filter(
+            pk=instance.pk).values_list('image', flat=True).first() or None
+    return instance._saved_image
+
+
+@receiver(pre_save, sender=Recipe)
+def load_saved_image(sender, instance, **kwargs):
+    if 'image' in instance.__dict__:
+        saved_image(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    if 'image' not in instance.__dict__:
+        return
+    image = instance.image.name or None
+    if image != instance._saved_image:
+        if image:
+            ImageBlob.objects.acquire(image)
+        if instance._saved_image:
+            ImageBlob.objects.release(instance._saved_image)
+        instance._saved_image = image
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    if saved_image(instance):
+        ImageBlob.objects.release(instance._saved_image)
+
+
+# The library statistics count recipes per price and cooking time. Like
+# the image, the saved values are remembered on load, to apply the
+# difference when they change.
+STAT_FIELDS = ('price', 'time_minutes')
+
+
+@receiver(post_init, sender=Recipe)
+def remember_stat_fields(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance._saved_stat_fields = None
+    elif all(name in instance.__dict__ for name in STAT_FIELDS):
+        instance._saved_stat_fields = tuple(
+            instance.__dict__[name] for name in STAT_FIELDS)
+
+
+def saved_stat_fields(instance):
+    if not hasattr(instance, '_saved_stat_fields'):
+        instance._saved_stat_fields = Recipe.objects.filter(
+            pk=instance.pk).values_list(*STAT_FIELDS).first()
+    return instance._saved_stat_fields
+
+
+@receiver(pre_save, sender=Recipe)
+def load_saved_stat_fields(sender, instance, **kwargs):
+    if any(name in instance.__dict__ for name in STAT_FIELDS):
+        saved_stat_fields(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_stats_saved(sender, instance, **kwargs):
+    if not any(name in instance.__dict__ for name in STAT_FIELDS):
+        return
+    saved = instance._saved_stat_fields
+    current = tuple(
+        instance.__dict__.get(name, value)
+        for name, value in zip(STAT_FIELDS, saved or (None, None))
+    )
+    deltas = stats.recipe_deltas(*current)
+    if saved:
+        deltas.update(stats.recipe_deltas(*saved, sign=-1))
+    RecipeStat.objects.add(instance.user_id, deltas)
+    instance._saved_stat_fields = current
+
+
+# Deleting a recipe removes its tags and ingredients without sending
+# m2m_changed, so their usage is counted down before the rows go.
+@receiver(pre_delete, sender=Recipe)
+def recipe_stats_deleted(sender, instance, **kwargs):
+    saved = saved_stat_fields(instance)
+    if not saved:
+        return
+    RecipeStat.objects.add(
+        instance.user_id, stats.recipe_deltas(*saved, sign=-1))
+
+    for field, (model, collection) in stats.RELATIONS.items():
+        linked = stats.linked_ids(field, recipe_ids=[instance.pk])
+        if linked:
+            stats.add_usage(field, linked, -1)
+            CollectionVersion.objects.bump(instance.user_id, collection)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_usage(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    field = 'tags' if sender is Recipe.tags.through else 'ingredients'
+    if action == 'post_add':
+        # pk_set only holds the ids that were not linked yet.
+        linked = pk_set
+        sign = 1
+    elif action in ('pre_remove', 'pre_clear'):
+        # pk_set holds every id given to remove(), linked or not.
+        ids = {'related_ids' if reverse else 'recipe_ids': [instance.pk]}
+        if pk_set is not None:
+            ids['recipe_ids' if reverse else 'related_ids'] = pk_set
+        linked = stats.linked_ids(field, **ids)
+        sign = -1
+    else:
+        return
+
+    if reverse:
+        # One use of this tag or ingredient per linked recipe.
+        linked = [instance.pk] * len(linked)
+    stats.add_usage(field, linked, sign)
+
+
+# Recipes reference tags and ingredients, and deleting one removes it
+# from every recipe without sending m2m_changed.
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    CollectionVersion.objects.bump(
+        instance.user_id, CollectionVersion.TAG, CollectionVersion.RECIPE)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    CollectionVersion.objects.bump(
+        instance.user_id,
+        CollectionVersion.INGREDIENT,
+        CollectionVersion.RECIPE
+    )
+
+
+# Linking changes the usage of tags and ingredients too.
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        CollectionVersion.objects.bump(
+            instance.user_id,
+            CollectionVersion.RECIPE,
+            CollectionVersion.TAG if sender is Recipe.tags.through
+            else CollectionVersion.INGREDIENT
+        )
+
+
+# Deleting a user cascades to their recipes, tags and ingredients, whose
+# handlers above recreate version and statistics rows after the user's
+# own were deleted. The user row goes last, so drop those rows again here.
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    CollectionVersion.objects.filter(user_id=instance.pk).delete()
+    RecipeStat.objects.filter(user_id=instance.pk).delete()
@@ -0,0 +1,204 @@
+"""Per-user statistics of the recipe library.
+
+Counting a library with aggregate queries costs a scan of the user's
+recipes and their relations on every read. Instead, RecipeStat rows hold
+the number of recipes per price and per cooking time, and the ``usage``
+of each tag and ingredient the number of recipes using it. They are
+updated with deltas by the model signals and the bulk writers, and the
+statistics are computed from those rows, whose number is bounded by the
+distinct values rather than the size of the library. ``rebuild``
+recomputes them from the recipes, to repair drift from writes that
+bypass both (raw SQL, ``QuerySet.update``).
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Now
+
+from .models import CollectionVersion, Ingredient, Recipe, RecipeStat, Tag
+
+# Model and collection of each recipe relation.
+RELATIONS = {
+    'tags': (Tag, CollectionVersion.TAG),
+    'ingredients': (Ingredient, CollectionVersion.INGREDIENT),
+}
+
+# Upper bounds, in minutes, of the cooking time distribution.
+TIME_BUCKETS = (15, 30, 60, 120)
+
+CENT = Decimal('0.01')
+
+
+def price_key(price):
+    return int(Decimal(str(price)).quantize(CENT).scaleb(2))
+
+
+def recipe_deltas(price, time_minutes, sign=1):
+    """The count deltas of adding (or removing, with ``sign`` -1) a
+    recipe, without its relations.
+    """
+    return Counter({
+        (RecipeStat.PRICE, price_key(price)): sign,
+        (RecipeStat.TIME, time_minutes): sign,
+    })
+
+
+def add_usage(field, ids, sign=1):
+    """Add (or subtract, with ``sign`` -1) a use to the related object
+    of ``field`` of each of ``ids``, which may repeat, with one atomic
+    update per distinct delta.
+    """
+    model = RELATIONS[field][0]
+    by_delta = defaultdict(list)
+    for pk, count in Counter(ids).items():
+        by_delta[count * sign].append(pk)
+
+    for delta, pks in sorted(by_delta.items()):
+        model.objects.filter(pk__in=sorted(pks)).update(
+            usage=Greatest(F('usage') + delta, Value(0)))
+
+
+def linked_ids(field, recipe_ids=None, related_ids=None):
+    """The related ids of the through rows of ``field``, one per row,
+    restricted to the given recipes and related objects.
+    """
+    m2m = Recipe._meta.get_field(field)
+    source = m2m.m2m_field_name()
+    target = m2m.m2m_reverse_field_name()
+
+    rows = m2m.remote_field.through.objects.all()
+    if recipe_ids is not None:
+        rows = rows.filter(**{f'{source}__in': recipe_ids})
+    if related_ids is not None:
+        rows = rows.filter(**{f'{target}__in': related_ids})
+    return rows.values_list(target, flat=True)
+
+
+def _median(histogram, count):
+    """The median of the values of a sorted ``[(value, count)]``."""
+    middle = ((count - 1) // 2, count // 2)
+    values, seen = [], 0
+    for value, n in histogram:
+        values.extend(value for i in middle if seen <= i < seen + n)
+        seen += n
+        if len(values) == 2:
+            return sum(values) / 2
+
+
+def _usage(field, user_id):
+    """``[{id, name, recipes}]`` of the user's objects used by recipes
+    through ``field``, the most used first.
+    """
+    return list(RELATIONS[field][0].objects.filter(
+        user_id=user_id, usage__gt=0
+    ).order_by('-usage', 'name', 'id').values(
+        'id', 'name', recipes=F('usage')))
+
+
+def summary(user_id):
+    """The statistics of the user's library."""
+    rows = {RecipeStat.PRICE: [], RecipeStat.TIME: []}
+    for kind, key, count in RecipeStat.objects.filter(
+            user_id=user_id, count__gt=0
+    ).order_by('kind', 'key').values_list('kind', 'key', 'count'):
+        rows[kind].append((key, count))
+
+    prices, times = rows[RecipeStat.PRICE], rows[RecipeStat.TIME]
+    recipes = sum(count for key, count in prices)
+
+    distribution = [
+        {'max': bound, 'recipes': 0} for bound in (*TIME_BUCKETS, None)
+    ]
+    for minutes, count in times:
+        bucket = next(
+            b for b in distribution
+            if b['max'] is None or minutes <= b['max']
+        )
+        bucket['recipes'] += count
+
+    def cents(value):
+        return None if value is None else str(
+            (Decimal(value) / 100).quantize(CENT))
+
+    return {
+        'recipes': recipes,
+        'price': {
+            'average': cents(
+                Decimal(sum(key * count for key, count in prices)) / recipes
+                if recipes else None),
+            'median': cents(_median(prices, recipes)),
+        },
+        'time_minutes': {
+            'median': _median(times, recipes),
+            'distribution': distribution,
+        },
+        'tags': _usage('tags', user_id),
+        'ingredients': _usage('ingredients', user_id),
+    }
+
+
+def rebuild(user_ids=None):
+    """Recompute the statistics of the given users (all by default)
+    from their recipes. Returns the number of RecipeStat rows written
+    and the number of usage counters that were corrected.
+
+    Writes to the recipes wait for the rebuild, so that no delta is
+    applied to rows about to be replaced. The collections are bumped,
+    as the statistics and usage served for their version may change.
+    """
+    recipe_table = Recipe._meta.db_table
+    tables = [recipe_table]
+    where, params = '', []
+    if user_ids is not None:
+        where = 'WHERE {}.user_id = ANY(%s)'
+        params = [list(user_ids)]
+
+    selects = [
+        f"SELECT r.user_id, '{RecipeStat.PRICE}', "
+        f'round(r.price * 100)::bigint, count(*) '
+        f'FROM {recipe_table} r {where.format("r")} GROUP BY 1, 3',
+        f"SELECT r.user_id, '{RecipeStat.TIME}', r.time_minutes, "
+        f'count(*) FROM {recipe_table} r {where.format("r")} GROUP BY 1, 3',
+    ]
+    usages = []
+    for field, (model, collection) in RELATIONS.items():
+        m2m = Recipe._meta.get_field(field)
+        through = m2m.remote_field.through._meta.db_table
+        target = m2m.m2m_reverse_name()
+        table = model._meta.db_table
+        tables.append(through)
+        usages.append(
+            f'UPDATE {table} o SET usage = c.n FROM ('
+            f'  SELECT a.id, count(t.{target}) AS n FROM {table} a '
+            f'  LEFT JOIN {through} t ON t.{target} = a.id '
+            f'  {where.format("a")} GROUP BY a.id'
+            f') c WHERE o.id = c.id AND o.usage <> c.n'
+        )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {", ".join(tables)} IN SHARE MODE')
+        stats = RecipeStat.objects.all()
+        versions = CollectionVersion.objects.filter(collection__in=[
+            CollectionVersion.RECIPE,
+            *(collection for model, collection in RELATIONS.values())
+        ])
+        if user_ids is not None:
+            stats = stats.filter(user_id__in=user_ids)
+            versions = versions.filter(user_id__in=user_ids)
+        stats.delete()
+
+        cursor.execute(
+            f'INSERT INTO {RecipeStat._meta.db_table} '
+            '(user_id, kind, key, count) ' + ' UNION ALL '.join(selects),
+            params * len(selects)
+        )
+        rows = cursor.rowcount
+        corrected = 0
+        for sql in usages:
+            cursor.execute(sql, params)
+            corrected += cursor.rowcount
+
+        versions.update(version=F('version') + 1, modified=Now())
+        return rows, corrected
@@ -0,0 +1,117 @@
+"""Content-addressed storage of uploaded images.
+
+Each upload is named after the sha256 of its content, computed while it
+is copied into the storage, so identical images are stored once however
+many recipes use them. ImageBlob rows count the recipes referencing
+each stored image (see core.signals); images no recipe references any
+more are deleted by ``collect_garbage``, along with their renditions.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files ``<sha256><ext>`` inside the
+    directory of the name they are saved under.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The name is chosen by _save, and equal names hold equal content.
+        return name
+
+    def _save(self, name, content):
+        from .models import ImageBlob
+
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        tmp, digest = self._write_temporary(directory, content)
+
+        name = os.path.join(directory, digest + ext)
+        try:
+            # Waits for a garbage collection of this blob in progress, so
+            # the file checked below is not deleted under us.
+            ImageBlob.objects.touch(name)
+            if not self.exists(name):
+                os.replace(tmp, self.path(name))
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+        return name.replace('\\', '/')
+
+    def derived_name(self, name, suffix):
+        """Name of a file derived from ``name``, such as a rendition."""
+        return f'{os.path.splitext(name)[0]}_{suffix}.jpg'
+
+    def save_derived(self, name, suffix, content):
+        """Store a file derived from ``name``, replacing any previous one,
+        and return its name.
+        """
+        derived = self.derived_name(name, suffix)
+        tmp, _ = self._write_temporary(os.path.dirname(derived), content)
+        os.replace(tmp, self.path(derived))
+        return derived
+
+    def _write_temporary(self, directory, content):
+        """Copy ``content`` to a temporary file in ``directory``, so it
+        can be renamed into place atomically, and return its path and
+        the hex sha256 of the content.
+        """
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+                dir=self.path(directory), delete=False) as tmp:
+            try:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                os.chmod(tmp.name, self.file_permissions_mode or 0o644)
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+
+        return tmp.name, digest.hexdigest()
+
+    def delete_blob(self, name, suffixes=()):
+        self.delete(name)
+        for suffix in suffixes:
+            self.delete(self.derived_name(name, suffix))
+
+
+def collect_garbage(grace=None):
+    """Delete the stored images no recipe has referenced for ``grace``
+    (a timedelta, IMAGE_BLOB_GC_GRACE seconds by default), and their
+    renditions. Return how many were deleted.
+
+    The grace period covers the time between storing an upload and
+    saving the recipe referencing it.
+    """
+    from .models import ImageBlob, Recipe
+
+    if grace is None:
+        grace = timedelta(seconds=settings.IMAGE_BLOB_GC_GRACE)
+    storage = Recipe._meta.get_field('image').storage
+    orphaned = ImageBlob.objects.filter(
+        refcount=0, modified__lt=timezone.now() - grace)
+
+    deleted = 0
+    for pk in orphaned.values_list('pk', flat=True).iterator():
+        with transaction.atomic():
+            blob = orphaned.select_for_update(skip_locked=True).filter(
+                pk=pk).first()
+            if blob is None:
+                continue
+            storage.delete_blob(blob.name, settings.IMAGE_RENDITIONS)
+            blob.delete()
+            deleted += 1
+
+    return deleted
@@ -0,0 +1,81 @@
+"""Synthetic dataset generation for benchmarks.
+
+Rows are generated server side with ``generate_series`` so that millions
+of recipes can be seeded in seconds. Every statement runs on the given
+cursor, so callers decide whether the data is kept or rolled back.
+"""
+from django.contrib.auth import get_user_model
+
+from core import stats
+from core.models import Ingredient, Recipe, Tag
+
+
+def seed(cursor, users=10, tags=50, ingredients=100, recipes=1000,
+         links=3, prefix='bench'):
+    """Seed ``users`` users, each with its own tags, ingredients and
+    recipes. Every recipe is linked to ``links`` tags and ``links``
+    ingredients. Returns the ids of the created users.
+    """
+    links = min(links, tags, ingredients)
+    user_table = get_user_model()._meta.db_table
+
+    cursor.execute(
+        f'INSERT INTO {user_table} '
+        '(password, is_superuser, email, name, is_active, is_staff) '
+        "SELECT '!', false, %s || '-' || g || '@example.com', "
+        "       'User ' || g, true, false "
+        'FROM generate_series(1, %s) g RETURNING id',
+        [prefix, users]
+    )
+    user_ids = [row[0] for row in cursor.fetchall()]
+
+    for model, count in ((Tag, tags), (Ingredient, ingredients)):
+        cursor.execute(
+            f'INSERT INTO {model._meta.db_table} (name, user_id, usage) '
+            "SELECT %s || '-' || g, u, 0 "
+            'FROM unnest(%s) u CROSS JOIN generate_series(1, %s) g',
+            [model._meta.model_name, user_ids, count]
+        )
+
+    cursor.execute(
+        f'INSERT INTO {Recipe._meta.db_table} '
+        '(user_id, title, time_minutes, price, link, '
+        ' image_status, image_renditions) '
+        "SELECT u, 'Recipe ' || g, 5 + g %% 175, "
+        "       (1 + g %% 4999) / 100.0, '', '', '{}' "
+        'FROM unnest(%s) u CROSS JOIN generate_series(1, %s) g',
+        [user_ids, recipes]
+    )
+
+    for field, count in (('tags', tags), ('ingredients', ingredients)):
+        _link(cursor, field, user_ids, count, links)
+    stats.rebuild(user_ids)
+
+    return user_ids
+
+
+def _link(cursor, field, user_ids, count, links):
+    """Link each recipe to ``links`` distinct rows of the related model,
+    spreading the links evenly over the user's rows.
+    """
+    m2m = Recipe._meta.get_field(field)
+    through = m2m.remote_field.through._meta.db_table
+    related = m2m.related_model._meta.db_table
+    source = m2m.m2m_column_name()
+    target = m2m.m2m_reverse_name()
+
+    cursor.execute(
+        f'WITH r AS ('
+        f'  SELECT id, user_id, row_number() OVER '
+        f'    (PARTITION BY user_id ORDER BY id) - 1 AS n '
+        f'  FROM {Recipe._meta.db_table} WHERE user_id = ANY(%s)'
+        f'), t AS ('
+        f'  SELECT user_id, array_agg(id ORDER BY id) AS ids '
+        f'  FROM {related} WHERE user_id = ANY(%s) GROUP BY user_id'
+        f') '
+        f'INSERT INTO {through} ({source}, {target}) '
+        f'SELECT r.id, t.ids[1 + (r.n * 7 + k) %% %s] '
+        f'FROM r JOIN t ON t.user_id = r.user_id '
+        f'CROSS JOIN generate_series(0, %s - 1) k',
+        [user_ids, user_ids, count, links]
+    )
@@ -1,8 +1,20 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db import OperationalError
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.urls import resolve
+
+from core import benchmark
+from core.models import Recipe, RecipeStat, Tag
+from recipe import urls as recipe_urls
+from user import urls as user_urls
 
 
 class CommandTests(TestCase):
@@ -19,3 +31,146 @@ class CommandTests(TestCase):
     def test_wait_for_db_ready_after_5_attempts(self, gi, ts):
         call_command('wait_for_db')
         self.assertEqual(gi.call_count, 6)
+
+    def test_bench_indexes_rolls_back(self):
+        out = StringIO()
+        call_command('bench_indexes', users=2, recipes=20, tags=5,
+                     ingredients=5, runs=1, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('with indexes', output)
+        self.assertIn('without indexes', output)
+        self.assertIn('recipe list: median', output)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class ExportLibraryTests(TransactionTestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        self.users = [
+            get_user_model().objects.create_user(f'user{i}@bar.gr', 'test')
+            for i in range(3)
+        ]
+        for user in self.users:
+            recipe = Recipe.objects.create(
+                user=user, title=f'Recipe of {user.email}', time_minutes=5,
+                price=1)
+            recipe.tags.add(Tag.objects.create(user=user, name='Vegan'))
+
+    def read(self, user, name):
+        with open(os.path.join(self.output_dir, str(user.pk), name)) as f:
+            return f.read()
+
+    def assert_exported(self, workers):
+        out = StringIO()
+        call_command('export_library', self.output_dir, workers=workers,
+                     stdout=out)
+
+        self.assertIn('Exported 3 users', out.getvalue())
+        for user in self.users:
+            recipe = json.loads(self.read(user, 'recipes.ndjson'))
+            self.assertEqual(recipe['title'], f'Recipe of {user.email}')
+            self.assertEqual(recipe['tags'], ['Vegan'])
+            self.assertIn('"name":"Vegan"', self.read(user, 'tags.ndjson'))
+            self.assertEqual(self.read(user, 'ingredients.ndjson'), '')
+
+    def test_export_in_process(self):
+        self.assert_exported(workers=1)
+
+    def test_export_in_worker_processes(self):
+        self.assert_exported(workers=2)
+
+
+class ImportRecipesTests(TestCase):
+
+    def test_import_recipes(self):
+        user = get_user_model().objects.create_user('foo@bar.gr', 'test')
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as f:
+            f.write(json.dumps({'title': 'Curry', 'time_minutes': 30,
+                                'price': '7.50', 'tags': ['Vegan']}) + '\n')
+            f.write('{}\n')
+            f.flush()
+            out, err = StringIO(), StringIO()
+            call_command('import_recipes', 'foo@bar.gr', f.name,
+                         stdout=out, stderr=err)
+
+        self.assertIn('2 processed, 1 created, 1 failed', out.getvalue())
+        self.assertIn('Line 2:', err.getvalue())
+        recipe = Recipe.objects.get(user=user)
+        self.assertEqual(
+            list(recipe.tags.values_list('name', flat=True)), ['Vegan'])
+
+
+class RebuildStatsTests(TestCase):
+
+    def test_rebuild_stats(self):
+        user = get_user_model().objects.create_user('foo@bar.gr', 'test')
+        recipe = Recipe.objects.create(
+            user=user, title='Curry', time_minutes=30, price=7)
+        recipe.tags.add(Tag.objects.create(user=user, name='Vegan'))
+        Recipe.objects.update(price=9)
+        Tag.objects.update(usage=5)
+        out = StringIO()
+
+        call_command('rebuild_stats', '--users', str(user.pk), stdout=out)
+
+        self.assertIn('Rebuilt 2 statistics rows, corrected 1 usage '
+                      'counters.', out.getvalue())
+        self.assertEqual(
+            RecipeStat.objects.get(user=user, kind=RecipeStat.PRICE).key, 900)
+        self.assertEqual(Tag.objects.get().usage, 1)
+
+
+class BenchTests(TestCase):
+
+    def test_bench_reports_every_endpoint(self):
+        out = StringIO()
+        call_command('bench', users=2, recipes=10, tags=3, ingredients=3,
+                     links=1, requests=2, warmup=0, stdout=out,
+                     stderr=StringIO())
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['dataset']['requests'], 2)
+        self.assertIn('recipe stats', report['endpoints'])
+        for result in report['endpoints'].values():
+            self.assertLess(result['status'], 400)
+            self.assertLessEqual(result['p50'], result['p99'])
+            self.assertGreaterEqual(result['queries'], 0)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_endpoints_cover_the_routes(self):
+        user = get_user_model().objects.create_user(
+            'bench@example.com', 'testpass')
+        Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=1)
+
+        reached = {
+            resolve(endpoint.url).view_name
+            for endpoint in benchmark.endpoints(user)
+        }
+        routes = {
+            f'recipe:{url.name}' for url in recipe_urls.router.urls
+        } | {f'user:{url.name}' for url in user_urls.urlpatterns}
+        self.assertEqual(routes, reached)
+
+    def test_compare_detects_regressions(self):
+        baseline = {
+            'recipe list': {'p95': 10.0, 'queries': 2},
+            'tag list': {'p95': 1.0, 'queries': 2},
+        }
+        results = {
+            'recipe list': {'p95': 13.0, 'queries': 2},
+            'tag list': {'p95': 1.9, 'queries': 3},
+            'new': {'p95': 100.0, 'queries': 50},
+        }
+
+        self.assertEqual(benchmark.compare(results, baseline), [
+            'recipe list: p95 10.000 -> 13.000 ms',
+            'tag list: 2 -> 3 queries',
+        ])
+        self.assertEqual(
+            benchmark.compare(results, baseline, threshold=0.5), [
+                'tag list: 2 -> 3 queries',
+            ])
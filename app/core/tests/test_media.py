@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+NAME = '3d6be617-ca8e-4ac6-8192-53dd37708619.jpg'
+CONTENT = bytes(range(256)) * 4
+
+
+class MediaServeTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(MEDIA_ROOT=self.root,
+                                     MEDIA_SERVE_MODE='python')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        os.makedirs(os.path.join(self.root, 'uploads/recipe'))
+        for name in (NAME, 'plain.jpg'):
+            with open(os.path.join(self.root, 'uploads/recipe', name),
+                      'wb') as f:
+                f.write(CONTENT)
+
+    def get(self, name=NAME, **headers):
+        return self.client.get(f'/media/uploads/recipe/{name}', **headers)
+
+    def test_serves_file(self):
+        resp = self.get()
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT)
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+        self.assertEqual(resp['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(resp['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', resp['Cache-Control'])
+
+    def test_non_hashed_names_are_revalidated(self):
+        resp = self.get('plain.jpg')
+
+        self.assertEqual(resp['Cache-Control'], 'public, no-cache')
+
+    def test_conditional_get(self):
+        etag = self.get()['ETag']
+
+        resp = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_range(self):
+        resp = self.get(HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT[10:20])
+        self.assertEqual(resp['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(resp['Content-Length'], '10')
+
+    def test_suffix_and_open_ranges(self):
+        resp = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT[-5:])
+
+        resp = self.get(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT[1000:])
+
+    def test_unsatisfiable_range(self):
+        resp = self.get(HTTP_RANGE=f'bytes={len(CONTENT)}-')
+
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_stale_if_range_serves_whole_file(self):
+        resp = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(resp.status_code, 200)
+
+        etag = resp['ETag']
+        resp = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(resp.status_code, 206)
+
+    def test_path_outside_media_root(self):
+        self.assertEqual(self.get('../../../etc/passwd').status_code, 404)
+        self.assertEqual(self.get('missing.jpg').status_code, 404)
+
+    def test_proxy_modes(self):
+        with self.settings(MEDIA_SERVE_MODE='x-accel'):
+            resp = self.get()
+        self.assertEqual(resp['X-Accel-Redirect'],
+                         f'/protected-media/uploads/recipe/{NAME}')
+        self.assertEqual(resp.content, b'')
+
+        with self.settings(MEDIA_SERVE_MODE='x-sendfile'):
+            resp = self.get()
+        self.assertEqual(resp['X-Sendfile'],
+                         os.path.join(self.root, 'uploads/recipe', NAME))
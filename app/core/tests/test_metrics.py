@@ -0,0 +1,155 @@
+import multiprocessing
+import re
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+
+METRICS_URL = reverse('metrics')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def sample(text, line):
+    """The value of the sample ``line`` (name and labels) in ``text``."""
+    match = re.search(rf'^{re.escape(line)} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def increment(directory, times):
+    values = metrics.FileValues(directory)
+    for i in range(times):
+        values.inc('shared', 1)
+        values.inc(f'key-{i % 5}', 0.5)
+
+
+@override_settings(METRICS_TOKEN='scrape-secret')
+class MetricsEndpointTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        self.client = APIClient()
+
+    def scrape(self):
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], metrics.CONTENT_TYPE)
+        return res.content.decode()
+
+    def test_requests_are_recorded(self):
+        labels = 'method="GET",route="recipe:tag-list",status="200"'
+        before = self.scrape()
+
+        self.client.force_authenticate(self.user)
+        for _ in range(3):
+            self.client.get(TAGS_URL)
+        self.client.force_authenticate(None)
+        self.client.get(TAGS_URL)
+        after = self.scrape()
+
+        for name in ('http_requests_total',
+                     'http_request_duration_seconds_count'):
+            self.assertEqual(
+                sample(after, f'{name}{{{labels}}}') -
+                sample(before, f'{name}{{{labels}}}'), 3)
+        unauthorized = labels.replace('200', '401')
+        self.assertEqual(
+            sample(after, f'http_requests_total{{{unauthorized}}}') -
+            sample(before, f'http_requests_total{{{unauthorized}}}'), 1)
+        self.assertGreater(
+            sample(after, 'db_queries_total{route="recipe:tag-list"}'),
+            sample(before, 'db_queries_total{route="recipe:tag-list"}'))
+        self.assertIn('# TYPE http_requests_total counter', after)
+        self.assertIn('# TYPE db_queries_total counter', after)
+        self.assertIn('# TYPE http_request_db_duration_seconds histogram',
+                      after)
+        self.assertIn('# TYPE image_upload_size_bytes histogram', after)
+
+    def test_requires_the_token(self):
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+                        {'HTTP_AUTHORIZATION': 'Token scrape-secret'}):
+            res = self.client.get(METRICS_URL, **headers)
+            self.assertEqual(res.status_code, 404)
+
+    def test_disabled_without_a_token(self):
+        with override_settings(METRICS_TOKEN=None):
+            res = self.client.get(
+                METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+        self.assertEqual(res.status_code, 404)
+
+
+class RegistryTests(TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry(metrics.LocalValues())
+
+    def test_render(self):
+        counter = self.registry.counter('jobs', 'Jobs run.', ('queue', ))
+        histogram = self.registry.histogram(
+            'job_seconds', 'Job latency.', buckets=(0.1, 1))
+        counter.inc(queue='a"b')
+        counter.inc(2, queue='a"b')
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+
+        self.assertEqual(self.registry.render(), '\n'.join([
+            '# HELP job_seconds Job latency.',
+            '# TYPE job_seconds histogram',
+            'job_seconds_bucket{le="0.1"} 2',
+            'job_seconds_bucket{le="1"} 3',
+            'job_seconds_bucket{le="+Inf"} 4',
+            'job_seconds_sum 3.65',
+            'job_seconds_count 4',
+            '# HELP jobs_total Jobs run.',
+            '# TYPE jobs_total counter',
+            'jobs_total{queue="a\\"b"} 3',
+        ]) + '\n')
+
+    def test_labels_are_checked(self):
+        counter = self.registry.counter('jobs', 'Jobs run.', ('queue', ))
+
+        with self.assertRaises(ValueError):
+            counter.inc(queue='a', worker='1')
+
+
+class FileValuesTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_aggregates_processes(self):
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.directory, 100))
+            for _ in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        increment(self.directory, 10)
+
+        values = metrics.FileValues(self.directory).collect()
+        self.assertEqual(values['shared'], 310)
+        self.assertEqual(values['key-0'], 31)
+
+    def test_grows_and_reopens(self):
+        values = metrics.FileValues(self.directory)
+        keys = [f'{i}-' + 'x' * 100 for i in range(2000)]
+        for key in keys:
+            values.inc(key, 1)
+
+        reopened = metrics.FileValues(self.directory)
+        reopened.inc(keys[0], 1)
+        collected = reopened.collect()
+        self.assertEqual(len(collected), len(keys))
+        self.assertEqual(collected[keys[0]], 2)
+        self.assertEqual(collected[keys[-1]], 1)
@@ -1,9 +1,11 @@
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
 from unittest.mock import patch
 
-from core.models import Tag, Ingredient, Recipe, recipe_image_file_path
+from core.models import CollectionVersion, Tag, Ingredient, Recipe, \
+    recipe_image_file_path
 
 
 def sample_user(email='foo@bar.gr', password='pass123'):
@@ -89,6 +91,22 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(recipe), recipe.title)
 
+    def test_delete_user_with_recipes(self):
+        user = sample_user()
+        recipe = Recipe.objects.create(
+            user=user,
+            title='tomato soup',
+            time_minutes=5,
+            price=5.00
+        )
+        recipe.tags.add(Tag.objects.create(user=user, name='Vegan'))
+
+        user.delete()
+
+        self.assertFalse(CollectionVersion.objects.exists())
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
     @patch('uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         uuid = 'test-uuid'
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import ImageBlob, Recipe
+from core.storage import ContentAddressedStorage, collect_garbage
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(MEDIA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.storage = Recipe._meta.get_field('image').storage
+        self.user = get_user_model().objects.create_user(
+            'test@bar.gr', 'test123')
+
+    def create_recipe(self, content=b'image'):
+        recipe = Recipe.objects.create(
+            user=self.user, title='Recipe', time_minutes=5, price=1)
+        recipe.image.save('photo.JPG', ContentFile(content))
+        return recipe
+
+    def refcount(self, name):
+        return ImageBlob.objects.get(name=name).refcount
+
+    def test_identical_content_is_stored_once(self):
+        storage = ContentAddressedStorage(location=self.root)
+        first = storage.save('uploads/a.jpg', ContentFile(b'same'))
+        second = storage.save('uploads/b.JPG', ContentFile(b'same'))
+
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^uploads/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(os.listdir(os.path.join(self.root, 'uploads')),
+                         [os.path.basename(first)])
+        with storage.open(first) as f:
+            self.assertEqual(f.read(), b'same')
+
+    def test_recipes_reference_images(self):
+        first = self.create_recipe()
+        second = self.create_recipe()
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(self.refcount(name), 2)
+
+        first.delete()
+        self.assertEqual(self.refcount(name), 1)
+
+        second = Recipe.objects.only('id').get(pk=second.pk)
+        second.image.save('other.jpg', ContentFile(b'other'))
+        self.assertEqual(self.refcount(name), 0)
+        self.assertEqual(self.refcount(second.image.name), 1)
+
+    def test_collect_garbage(self):
+        kept = self.create_recipe(b'kept')
+        replaced = self.create_recipe(b'replaced')
+        name = replaced.image.name
+        rendition = self.storage.save_derived(
+            name, 'thumbnail', ContentFile(b'thumbnail'))
+        replaced.delete()
+
+        self.assertEqual(collect_garbage(), 0)
+        self.assertEqual(collect_garbage(timedelta(0)), 1)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(self.storage.exists(rendition))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertTrue(self.storage.exists(kept.image.name))
+
+    def test_gc_images_command(self):
+        self.create_recipe().delete()
+        out = StringIO()
+        call_command('gc_images', grace=0, stdout=out)
+
+        self.assertIn('Deleted 1 unreferenced images.', out.getvalue())
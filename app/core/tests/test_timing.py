@@ -0,0 +1,92 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Tag
+
+TAGS_URL = reverse('recipe:tag-list')
+TOKEN_URL = reverse('user:token')
+ME_URL = reverse('user:me')
+
+
+def server_timing(response):
+    """``{name: (duration, description)}`` of the Server-Timing header."""
+    metrics = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        metrics[name] = (float(params['dur']), params.get('desc'))
+    return metrics
+
+
+class ServerTimingTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client = APIClient()
+
+    def test_api_phases(self):
+        token = self.client.post(TOKEN_URL, {
+            'email': 'test@example.com', 'password': 'testpass'
+        }).data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(TAGS_URL)
+
+        metrics = server_timing(res)
+        self.assertEqual(list(metrics), [
+            'auth', 'serialize', 'view', 'render', 'db', 'total'])
+        self.assertEqual(metrics['db'][1], f'"{len(queries)} queries"')
+        for name, (duration, desc) in metrics.items():
+            self.assertGreaterEqual(duration, 0)
+            self.assertLessEqual(duration, metrics['total'][0])
+        self.assertLessEqual(metrics['serialize'][0], metrics['view'][0])
+
+    def test_serializer_data_is_timed(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['email'], 'test@example.com')
+        metrics = server_timing(res)
+        self.assertIn('serialize', metrics)
+        self.assertLessEqual(metrics['serialize'][0], metrics['view'][0])
+
+    def test_failed_authentication_is_timed(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, 401)
+        metrics = server_timing(res)
+        self.assertIn('auth', metrics)
+        self.assertNotIn('view', metrics)
+
+    def test_log_record(self):
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            res = self.client.post(TOKEN_URL, {
+                'email': 'test@example.com', 'password': 'testpass'
+            })
+
+        record, = logs.records
+        self.assertEqual(record.method, 'POST')
+        self.assertEqual(record.path, TOKEN_URL)
+        self.assertEqual(record.status, 200)
+        self.assertEqual(record.queries, int(re.search(
+            r'(\d+) queries', res['Server-Timing']).group(1)))
+        for name in ('auth', 'view', 'render', 'db', 'total'):
+            self.assertGreaterEqual(getattr(record, f'{name}_ms'), 0)
+
+    def test_plain_django_views(self):
+        res = self.client.get('/media/uploads/recipe/missing.jpg')
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(list(server_timing(res)), ['db', 'total'])
@@ -0,0 +1,177 @@
+"""Per-request timing of the phases of a request.
+
+ServerTimingMiddleware times the whole request, the SQL queries (through
+a database execute wrapper) and the rendering of template responses,
+which include DRF responses. Views using TimedAPIViewMixin add the time
+spent authenticating and in the handler, which builds the querysets and
+serializes the results. The phases are returned in a ``Server-Timing``
+header and logged to the ``core.timing`` logger, with the values as
+record attributes for structured log formatters.
+
+Serializing the response data, with ``serializer.data`` or the row
+serializers of the lists, is reported as its own ``serialize`` phase,
+part of the ``view`` phase. Query time overlaps the phases that ran the
+queries. The body of a streaming response is produced after the
+middleware returns, so its queries and time are not covered.
+"""
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class Timing:
+    """The durations, in milliseconds, of the phases of a request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self.db = 0.0
+        self._running = {}
+
+    def start(self, phase):
+        self._running[phase] = time.perf_counter()
+
+    def stop(self, phase):
+        started = self._running.pop(phase, None)
+        if started is not None:
+            self.phases[phase] = self.phases.get(phase, 0.0) + (
+                time.perf_counter() - started) * 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper counting and timing the queries."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += (time.perf_counter() - started) * 1000
+            self.queries += 1
+
+    @property
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def metrics(self):
+        """``{name: milliseconds}`` of the phases, db and total."""
+        return dict(self.phases, db=self.db, total=self.total)
+
+    def header(self, metrics):
+        return ', '.join(
+            f'{name};dur={duration:.1f}' + (
+                f';desc="{self.queries} queries"' if name == 'db' else '')
+            for name, duration in metrics.items()
+        )
+
+
+def get_timing(request):
+    return getattr(request, 'timing', None)
+
+
+@contextmanager
+def phase(request, name):
+    """Time the block as the ``name`` phase of the request, if timed."""
+    timing = get_timing(request)
+    if timing is None:
+        yield
+        return
+
+    timing.start(name)
+    try:
+        yield
+    finally:
+        timing.stop(name)
+
+
+@functools.lru_cache(maxsize=None)
+def timed_serializer_class(serializer_class):
+    """A subclass of ``serializer_class`` timing ``data`` as the
+    ``serialize`` phase of the request of its context.
+    """
+    def data(self):
+        with phase(self.context.get('request'), 'serialize'):
+            return serializer_class.data.fget(self)
+
+    return type(serializer_class.__name__, (serializer_class, ), {
+        'data': property(data),
+        '__module__': serializer_class.__module__,
+    })
+
+
+class ServerTimingMiddleware:
+    """Time each request and report its phases. Should come first in
+    MIDDLEWARE, so that the total covers the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.timing = timing = Timing()
+        with connection.execute_wrapper(timing):
+            response = self.get_response(request)
+
+        metrics = timing.metrics()
+        response['Server-Timing'] = timing.header(metrics)
+        if logger.isEnabledFor(logging.INFO):
+            self.log(request, response, timing, metrics)
+
+        return response
+
+    def log(self, request, response, timing, metrics):
+        logger.info(
+            '%s %s %s %.1fms (%d queries)',
+            request.method, request.path, response.status_code,
+            metrics['total'], timing.queries,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': timing.queries,
+                **{f'{name}_ms': round(duration, 3)
+                   for name, duration in metrics.items()},
+            }
+        )
+
+    def process_template_response(self, request, response):
+        # Runs last before the response is rendered, as this middleware
+        # comes first.
+        timing = get_timing(request)
+        if timing is not None:
+            timing.start('render')
+            response.add_post_render_callback(
+                lambda response: timing.stop('render'))
+        return response
+
+
+class TimedAPIViewMixin:
+    """Time the authentication, the handler and the serialization of
+    the response data of a DRF view.
+    """
+
+    def perform_authentication(self, request):
+        with phase(request, 'auth'):
+            super().perform_authentication(request)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if get_timing(self.request) is not None:
+            serializer.__class__ = timed_serializer_class(
+                serializer.__class__)
+        return serializer
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        timing = get_timing(request)
+        if timing is not None:
+            timing.start('view')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        timing = get_timing(request)
+        if timing is not None:
+            timing.stop('view')
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,147 @@
+from decimal import InvalidOperation
+
+from django.db.models import Count
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+def parse_ids(query_params, name):
+    """Parse a comma separated list of ids from the query string."""
+    value = query_params.get(name)
+    if not value:
+        return []
+
+    try:
+        return sorted({int(_id) for _id in value.split(',')})
+    except ValueError:
+        raise ValidationError(
+            {name: _('Expected a comma separated list of ids.')})
+
+
+def parse_number(query_params, name, type=int):
+    """Parse a non-negative number of ``type`` (int or Decimal) from the
+    query string, or return None if the parameter is missing.
+    """
+    value = query_params.get(name)
+    if value is None:
+        return None
+
+    try:
+        number = type(value)
+        if not 0 <= number < float('inf'):
+            raise ValueError
+    except (ValueError, InvalidOperation):
+        raise ValidationError({name: _('Expected a non-negative number.')})
+
+    return number
+
+
+def parse_search(query_params):
+    query = ' '.join(query_params.get('q', '').split())
+    if not query:
+        raise ValidationError({'q': _('This parameter is required.')})
+    if len(query) > 255:
+        raise ValidationError(
+            {'q': _('Ensure this value has at most 255 characters.')})
+
+    return query
+
+
+def parse_names(query_params, name, allowed):
+    """Parse a comma separated list of names out of ``allowed`` from the
+    query string, or return None if the parameter is missing.
+    """
+    value = query_params.get(name)
+    if value is None:
+        return None
+
+    names = [n for n in (n.strip() for n in value.split(',')) if n]
+    unknown = set(names) - set(allowed)
+    if unknown:
+        raise ValidationError({name: _(
+            'Unknown names: %(unknown)s. Expected any of: %(allowed)s.'
+        ) % {
+            'unknown': ', '.join(sorted(unknown)),
+            'allowed': ', '.join(allowed),
+        }})
+
+    return names
+
+
+def parse_prefix(query_params):
+    prefix = ' '.join(query_params.get('prefix', '').split()).lower()
+    if not prefix:
+        raise ValidationError({'prefix': _('This parameter is required.')})
+
+    return prefix
+
+
+def parse_limit(query_params, default, maximum):
+    try:
+        limit = int(query_params.get('limit', default))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= maximum:
+        raise ValidationError({'limit': _(
+            'Expected a number between 1 and %(maximum)d.'
+        ) % {'maximum': maximum}})
+
+    return limit
+
+
+def parse_choice(query_params, name, choices, default):
+    value = query_params.get(name, default)
+    if value not in choices:
+        raise ValidationError({name: _('Expected one of: %(choices)s.') % {
+            'choices': ', '.join(choices)}})
+
+    return value
+
+
+def parse_flag(query_params, name):
+    value = query_params.get(name, '0')
+    if value not in ('0', '1'):
+        raise ValidationError({name: _('Expected 0 or 1.')})
+
+    return value == '1'
+
+
+def parse_match(query_params):
+    match = query_params.get('match', MATCH_ANY)
+    if match not in (MATCH_ANY, MATCH_ALL):
+        raise ValidationError(
+            {'match': _('Expected one of: any, all.')})
+
+    return match
+
+
+def matching(queryset, field, ids, match=MATCH_ANY):
+    """Return the ids of rows of ``queryset`` related through the M2M
+    ``field`` to any (or all) of ``ids``, as a subquery on the through
+    table. Unlike a join on the relation, this never yields duplicates.
+    """
+    m2m = queryset.model._meta.get_field(field)
+    source = m2m.m2m_field_name()
+    target = m2m.m2m_reverse_field_name()
+
+    rows = m2m.remote_field.through.objects.filter(
+        **{f'{target}__in': ids})
+    if match == MATCH_ALL:
+        rows = rows.values(source).annotate(
+            matched=Count('pk')).filter(matched=len(ids))
+
+    return rows.values(source)
+
+
+def filter_related(queryset, field, ids=(), match=MATCH_ANY, exclude=()):
+    if ids:
+        queryset = queryset.filter(
+            pk__in=matching(queryset, field, ids, match))
+    if exclude:
+        queryset = queryset.exclude(
+            pk__in=matching(queryset, field, exclude))
+
+    return queryset
@@ -0,0 +1,120 @@
+"""Recipe image uploads and renditions.
+
+Uploads are streamed to a temporary file in chunks, so a request never
+holds more than one chunk of the image in memory. Renditions are
+generated after the request returns, by a small pool of worker threads
+(Pillow releases the GIL while decoding and resizing).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import StopUpload, \
+    TemporaryFileUploadHandler
+from django.db import connection, transaction
+from PIL import Image
+
+from core.models import CollectionVersion, Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Stream every uploaded file to disk, aborting the upload once it
+    exceeds ``max_size`` bytes.
+    """
+
+    def __init__(self, request, max_size):
+        super().__init__(request)
+        self.max_size = max_size
+        self.received = 0
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_RENDITION_WORKERS,
+                thread_name_prefix='renditions'
+            )
+    return _executor
+
+
+def schedule_renditions(recipe):
+    """Generate the renditions of the recipe's image once the current
+    transaction commits.
+    """
+    args = (recipe.pk, recipe.user_id, recipe.image.name)
+    if settings.IMAGE_RENDITIONS_ASYNC:
+        transaction.on_commit(
+            lambda: executor().submit(_render_in_worker, *args))
+    else:
+        render(*args)
+
+
+def _render_in_worker(*args):
+    try:
+        render(*args)
+    finally:
+        connection.close()
+
+
+def render(recipe_id, user_id, name):
+    """Generate the configured renditions of the image ``name`` and
+    record them on the recipe, unless its image has been replaced in
+    the meantime.
+
+    Renditions belong to the stored image, which may be shared by other
+    recipes, so existing ones are reused.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    sizes = sorted(settings.IMAGE_RENDITIONS.items(),
+                   key=lambda item: item[1], reverse=True)
+    renditions = {
+        rendition: storage.derived_name(name, rendition)
+        for rendition, _ in sizes
+    }
+
+    try:
+        if not all(map(storage.exists, renditions.values())):
+            _render(storage, name, sizes)
+        status = Recipe.IMAGE_READY
+    except Exception:
+        logger.exception('Rendering %s failed', name)
+        status = Recipe.IMAGE_FAILED
+        renditions = {}
+
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_status=status, image_renditions=renditions)
+    if updated:
+        CollectionVersion.objects.bump(user_id, CollectionVersion.RECIPE)
+
+
+def _render(storage, name, sizes):
+    with storage.open(name) as f:
+        image = Image.open(f)
+        # Let the JPEG decoder downscale while decoding, so the full
+        # resolution image is never held in memory.
+        image.draft('RGB', sizes[0][1])
+        image = image.convert('RGB')
+
+    for rendition, size in sizes:
+        image.thumbnail(size, Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+        storage.save_derived(name, rendition, ContentFile(buffer.getvalue()))
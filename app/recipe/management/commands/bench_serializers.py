@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+
+from core import synthetic
+from core.models import Recipe
+from recipe.rows import RowSerializer
+from recipe.serializer import RecipeSerializer
+from recipe.views import related_id_prefetches
+
+
+def serializer_body(queryset, rows):
+    queryset = queryset.prefetch_related(*related_id_prefetches())[:rows]
+    return JSONRenderer().render(RecipeSerializer(queryset, many=True).data)
+
+
+def row_body(queryset, rows):
+    serializer = RowSerializer(RecipeSerializer(), queryset)
+    return JSONRenderer().render(
+        serializer.to_representation(serializer.plan()[:rows]))
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset and compare rendering recipe lists '
+            'with RecipeSerializer and from values() rows. All data is '
+            'rolled back when the command finishes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+',
+                            default=[1000, 10000, 100000])
+        parser.add_argument('--tags', type=int, default=50,
+                            help='Tags of the user.')
+        parser.add_argument('--ingredients', type=int, default=100,
+                            help='Ingredients of the user.')
+        parser.add_argument('--links', type=int, default=3,
+                            help='Tags and ingredients per recipe.')
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.stdout.write('Seeding...')
+            user_id, = synthetic.seed(
+                cursor,
+                users=1,
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                recipes=max(options['rows']),
+                links=options['links'],
+            )
+            cursor.execute('ANALYZE')
+            queryset = Recipe.objects.filter(user_id=user_id).order_by('-id')
+
+            for rows in options['rows']:
+                timings = {}
+                bodies = {}
+                for name, render in (('serializer', serializer_body),
+                                     ('values', row_body)):
+                    samples = []
+                    for _ in range(options['runs']):
+                        started = time.perf_counter()
+                        bodies[name] = render(queryset, rows)
+                        samples.append(
+                            (time.perf_counter() - started) * 1000)
+                    timings[name] = statistics.median(samples)
+
+                if bodies['serializer'] != bodies['values']:
+                    raise CommandError(f'Outputs differ at {rows} rows.')
+
+                self.stdout.write(
+                    f'{rows} rows: serializer median '
+                    f'{timings["serializer"]:.1f} ms, values median '
+                    f'{timings["values"]:.1f} ms '
+                    f'({timings["serializer"] / timings["values"]:.1f}x), '
+                    f'identical output'
+                )
+
+            transaction.set_rollback(True)
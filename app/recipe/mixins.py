@@ -0,0 +1,119 @@
+import hashlib
+import time
+
+from django.utils.cache import get_conditional_response, \
+    patch_cache_control, patch_vary_headers
+from django.http import StreamingHttpResponse
+from django.utils.http import http_date, quote_etag
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from core import exports
+from core.models import CollectionVersion
+from core.timing import phase
+from . import filters
+from .rows import RowSerializer
+
+
+class ConditionalListMixin:
+    """Answer conditional list requests from the per-user collection
+    version, without running the list query or the serializer.
+    """
+    collection = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().list, *args, **kwargs)
+
+    def conditional_response(self, request, respond, *args, **kwargs):
+        """Return ``respond(request, *args, **kwargs)``, or a 304 response
+        if the collection has not changed since the client fetched it.
+        """
+        version, modified = CollectionVersion.objects.current(
+            request.user, self.collection)
+        etag = self.get_collection_etag(request, version)
+        # Last-Modified has a resolution of a second, so a write later
+        # in the second of the last one would leave it unchanged; it is
+        # only sent once that second is over.
+        last_modified = int(modified.timestamp()) if modified else None
+        if last_modified is not None and last_modified + 1 > time.time():
+            last_modified = None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = respond(request, *args, **kwargs)
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization', ))
+
+        return response
+
+    def get_collection_etag(self, request, version):
+        # The body also depends on the page, filters and output format.
+        key = ':'.join((
+            str(request.user.pk),
+            self.collection,
+            str(version),
+            request.get_full_path(),
+            request.accepted_media_type,
+        ))
+
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+
+class RowListMixin:
+    """List from ``values()`` rows instead of model instances whenever
+    the serializer's output can be built from them (see recipe.rows).
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = RowSerializer(self.get_serializer(), queryset)
+        queryset = rows.plan(extra=self.get_ordering_columns(queryset))
+        if queryset is None:
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginate_queryset(queryset)
+        with phase(request, 'serialize'):
+            data = rows.to_representation(
+                page if page is not None else queryset)
+        if page is not None:
+            return self.get_paginated_response(data)
+
+        return Response(data)
+
+    def get_ordering_columns(self, queryset):
+        """The columns a cursor paginator reads from the last rows."""
+        get_ordering = getattr(self.paginator, 'get_ordering', None)
+        if get_ordering is None:
+            return ()
+
+        return [
+            field.lstrip('-')
+            for field in get_ordering(self.request, queryset, self)
+        ]
+
+
+class ExportMixin:
+    """Add an ``export`` action streaming all the user's objects."""
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """All the user's objects as NDJSON, or CSV with ``?fmt=csv``.
+        (``format`` selects the renderer in DRF.)
+        """
+        fmt = filters.parse_choice(
+            request.query_params, 'fmt', exports.FORMATS, exports.NDJSON)
+        model = self.queryset.model
+
+        response = StreamingHttpResponse(
+            exports.lines(model, request.user.pk, fmt),
+            content_type=exports.FORMATS[fmt]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{exports.filename(model, fmt)}"')
+        return response
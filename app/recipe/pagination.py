@@ -0,0 +1,155 @@
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, \
+    LimitOffsetPagination, _reverse_ordering
+
+
+class BaseCursorPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+
+class KeysetCursorPagination(BaseCursorPagination):
+    """A cursor over every field of the ordering, which must be total
+    and in a single direction.
+
+    CursorPagination only keys on the first field and skips the rows
+    that share its value with an OFFSET, which grows with the number of
+    ties. Here the cursor holds the values of all the fields of the row
+    it stands for, and a page is the rows after it in a row-value
+    comparison, ``(price, id) > (%s, %s)``, which an index on those
+    columns serves without ever scanning the skipped rows.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(self.get_ordering(request, queryset, view))
+        self.cursor = self.decode_cursor(request)
+        reverse, position = (False, None) if self.cursor is None \
+            else (self.cursor.reverse, self.decode_position(queryset.model))
+
+        queryset = queryset.order_by(*(
+            _reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            queryset = self.after(queryset, position, reverse)
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = \
+                position is not None, has_following
+        else:
+            self.has_next, self.has_previous = \
+                has_following, position is not None
+
+        # Links of an empty page continue from the cursor itself.
+        self.first_position = self.last_position = position
+        if self.page:
+            self.first_position = self.get_position(self.page[0])
+            self.last_position = self.get_position(self.page[-1])
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def after(self, queryset, position, reverse):
+        """Filter ``queryset`` on the rows following ``position``."""
+        model = queryset.model
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(
+            f'{table}.{connection.ops.quote_name(field.column)}'
+            for field in map(model._meta.get_field, self.fields())
+        )
+        descending = self.ordering[0].startswith('-')
+        operator = '<' if descending != reverse else '>'
+        placeholders = ', '.join(['%s'] * len(position))
+
+        return queryset.extra(
+            where=[f'({columns}) {operator} ({placeholders})'],
+            params=position
+        )
+
+    def get_position(self, instance):
+        return [
+            instance[field] if isinstance(instance, dict)
+            else getattr(instance, field)
+            for field in self.fields()
+        ]
+
+    def decode_position(self, model):
+        """The values of the cursor, converted by the fields of ``model``
+        they are compared with, as they are passed to the query as is.
+        """
+        try:
+            values = json.loads(self.cursor.position)
+            if not isinstance(values, list) or \
+                    len(values) != len(self.ordering):
+                raise ValueError('Invalid position.')
+            position = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields(), values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None or
+               isinstance(value, Decimal) and not value.is_finite()
+               for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_position(self, position, reverse):
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=reverse,
+            position=json.dumps(position, cls=DjangoJSONEncoder)))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_position(self.last_position, False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_position(self.first_position, True)
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    """Follows the ordering of the queryset, which the view picks out of
+    the orderings it supports; each ends with the id, so that it is
+    total.
+    """
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        return queryset.query.order_by or super().get_ordering(
+            request, queryset, view)
+
+
+class NameCursorPagination(BaseCursorPagination):
+    ordering = '-name'
+
+
+class UsageCursorPagination(KeysetCursorPagination):
+    ordering = ('-usage', '-id')
+
+
+class SearchPagination(LimitOffsetPagination):
+    """Search results are ordered by rank, which a cursor can't follow."""
+    default_limit = 20
+    max_limit = 100
@@ -0,0 +1,86 @@
+"""Read-only serialization from ``values()`` rows.
+
+Building model instances and running every field of a ModelSerializer
+over them costs more than the query itself on long lists. For the
+serializers whose fields are plain columns, annotations and the ids of
+M2M relations, the same output is produced from dicts instead: the
+relation ids are fetched as ordered arrays in the main query, and each
+column goes through the ``to_representation`` of its serializer field.
+"""
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import IntegerField, OuterRef
+from rest_framework.relations import ManyRelatedField, \
+    PrimaryKeyRelatedField
+
+from core.expressions import ArraySubquery
+
+
+def related_ids(model, field):
+    """The ids related to the outer row through the M2M ``field`` of
+    ``model``, in id order (as the prefetches of the serializers).
+    """
+    m2m = model._meta.get_field(field)
+    source = m2m.m2m_field_name()
+    target = m2m.m2m_reverse_field_name()
+
+    return ArraySubquery(
+        m2m.remote_field.through.objects.filter(
+            **{source: OuterRef('pk')}
+        ).order_by(target).values(target),
+        output_field=ArrayField(IntegerField())
+    )
+
+
+class RowSerializer:
+    """Serialize ``values()`` rows of ``queryset`` as ``serializer``
+    would serialize its instances.
+
+    ``plan`` returns None if a field of the serializer can't be read
+    from a row, in which case the regular serializer must be used.
+    Columns the caller needs from the rows besides the output, such as
+    the ordering keys a cursor paginator reads, are given as ``extra``.
+    """
+
+    def __init__(self, serializer, queryset):
+        self.serializer = serializer
+        self.queryset = queryset
+
+    def plan(self, extra=()):
+        model = self.queryset.model
+        columns = {field.name for field in model._meta.concrete_fields}
+        annotations = set(self.queryset.query.annotations)
+        m2m = {field.name for field in model._meta.many_to_many}
+
+        values, relations, converters = [], {}, []
+        for name, field in self.serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source != name:
+                return None
+
+            if isinstance(field, ManyRelatedField):
+                if name not in m2m or not isinstance(
+                        field.child_relation, PrimaryKeyRelatedField):
+                    return None
+                relations[f'{name}_ids'] = related_ids(model, name)
+                converters.append((name, f'{name}_ids', list))
+            elif name in columns or name in annotations:
+                values.append(name)
+                converters.append((name, name, field.to_representation))
+            else:
+                return None
+
+        values.extend(name for name in extra if name not in values)
+        self.converters = converters
+        return self.queryset.prefetch_related(None).annotate(
+            **relations).values(*values, *relations)
+
+    def to_representation(self, rows):
+        converters = self.converters
+        return [
+            {
+                name: None if row[key] is None else convert(row[key])
+                for name, key, convert in converters
+            }
+            for row in rows
+        ]
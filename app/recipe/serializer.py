@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from core.models import Tag, Ingredient, Recipe
@@ -6,18 +7,66 @@ from core.models import Tag, Ingredient, Recipe
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
-        fields = ('id', 'name', )
-        read_only_fields = ('id', )
+        fields = ('id', 'name', 'usage')
+        read_only_fields = ('id', 'usage')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
+        fields = ('id', 'name', 'usage')
+        read_only_fields = ('id', 'usage')
+
+
+class NestedTagSerializer(TagSerializer):
+    """A tag nested in a recipe, without its usage."""
+    class Meta(TagSerializer.Meta):
         fields = ('id', 'name')
-        read_only_fields = ('id', )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class NestedIngredientSerializer(IngredientSerializer):
+    """An ingredient nested in a recipe, without its usage."""
+    class Meta(IngredientSerializer.Meta):
+        fields = ('id', 'name')
+
+
+class NameListSerializer(serializers.Serializer):
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=1000
+    )
+
+
+class ExpandableFieldsMixin:
+    """Shape the output after the serializer context: ``fields`` limits
+    it to the named fields, and ``expand`` nests the named relations,
+    the other ones being represented by their ids.
+    """
+    expandable = {
+        'tags': NestedTagSerializer,
+        'ingredients': NestedIngredientSerializer,
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        expand = self.context.get('expand')
+        if expand is not None:
+            for name, serializer in self.expandable.items():
+                if name in expand:
+                    self.fields[name] = serializer(many=True, read_only=True)
+                else:
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(
+                        many=True, read_only=True)
+
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class RecipeSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     ingredients = serializers.PrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
         many=True
@@ -40,14 +89,84 @@ class RecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', )
 
 
-class RecipeDetailSerializer(RecipeSerializer):
-    tags = TagSerializer(many=True, read_only=True)
-    ingredients = IngredientSerializer(many=True, read_only=True)
+class RecipeSearchSerializer(RecipeSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('rank', )
+
 
+class ImageRenditionsMixin(serializers.Serializer):
+    image_renditions = serializers.SerializerMethodField()
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+    def get_image_renditions(self, recipe):
+        storage = Recipe._meta.get_field('image').storage
+        request = self.context.get('request')
+        urls = {}
+        for rendition, name in recipe.image_renditions.items():
+            url = storage.url(name)
+            urls[rendition] = request.build_absolute_uri(url) \
+                if request else url
+        return urls
+
+
+class RecipeDetailSerializer(ImageRenditionsMixin, RecipeSerializer):
+    tags = NestedTagSerializer(many=True, read_only=True)
+    ingredients = NestedIngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'image', 'image_status', 'image_renditions')
+        read_only_fields = ('id', 'image', 'image_status')
+
+
+class RecipeBatchSerializer(serializers.ModelSerializer):
+    """Validates one item of a batch create. Related ids are checked
+    against the ``tag_ids``/``ingredient_ids`` sets in the context, which
+    the view loads once for the whole batch.
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        default=list
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        default=list
+    )
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image', )
+        fields = RecipeSerializer.Meta.fields
         read_only_fields = ('id', )
+
+    def _validate_related(self, value, known):
+        for pk in value:
+            if pk not in known:
+                raise serializers.ValidationError(
+                    f'Invalid pk "{pk}" - object does not exist.',
+                    code='does_not_exist'
+                )
+        return value
+
+    def validate_ingredients(self, value):
+        return self._validate_related(value, self.context['ingredient_ids'])
+
+    def validate_tags(self, value):
+        return self._validate_related(value, self.context['tag_ids'])
+
+
+class RecipeImageSerializer(ImageRenditionsMixin,
+                            serializers.ModelSerializer):
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'image', 'image_status', 'image_renditions')
+        read_only_fields = ('id', 'image_status')
+
+    def validate_image(self, value):
+        """Reject images whose decoded size would be unreasonable"""
+        width, height = value.image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise serializers.ValidationError(
+                'Image dimensions are too large.', code='too_large')
+        return value
@@ -0,0 +1,55 @@
+"""Incremental JSON rendering of whole querysets.
+
+The queryset is read with a server-side cursor, ``chunk_size`` rows at
+a time, and each chunk is serialized, rendered and handed to the server
+before the next one is fetched, so memory use doesn't grow with the
+size of the result.
+"""
+from itertools import islice
+
+from django.db.models import prefetch_related_objects
+from rest_framework.renderers import JSONRenderer
+
+from .rows import RowSerializer
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def serialized_chunks(serializer, queryset, chunk_size):
+    """Yield lists of the serialized items of ``queryset``.
+
+    Items are built from ``values()`` rows where possible. Otherwise the
+    instances of each chunk are serialized after running the queryset's
+    prefetches on them, which ``iterator()`` alone skips.
+    """
+    rows = RowSerializer(serializer, queryset)
+    values = rows.plan()
+    if values is not None:
+        for chunk in chunks(values.iterator(chunk_size), chunk_size):
+            yield rows.to_representation(chunk)
+        return
+
+    lookups = queryset._prefetch_related_lookups
+    instances = queryset.prefetch_related(None).iterator(chunk_size)
+    for chunk in chunks(instances, chunk_size):
+        prefetch_related_objects(chunk, *lookups)
+        yield type(serializer)(
+            chunk, many=True, context=serializer.context).data
+
+
+def json_array(serializer, queryset, chunk_size=2000):
+    """Yield the JSON array of the serialized ``queryset`` in pieces."""
+    renderer = JSONRenderer()
+    separator = b'['
+    for items in serialized_chunks(serializer, queryset, chunk_size):
+        yield separator + renderer.render(items)[1:-1]
+        separator = b','
+
+    yield b']' if separator == b',' else b'[]'
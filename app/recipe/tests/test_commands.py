@@ -0,0 +1,20 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Recipe
+
+
+class CommandTests(TestCase):
+
+    def test_bench_serializers_rolls_back(self):
+        out = StringIO()
+        call_command('bench_serializers', rows=[5, 20], tags=5,
+                     ingredients=5, runs=1, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('5 rows: serializer median', output)
+        self.assertIn('20 rows: serializer median', output)
+        self.assertIn('identical output', output)
+        self.assertFalse(Recipe.objects.exists())
@@ -1,13 +1,14 @@
 from django.contrib.auth import get_user_model
 from rest_framework import status
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 from recipe.serializer import IngredientSerializer
 from django.urls import reverse
 from rest_framework.test import APITestCase
 
 
 INGREDIENT_URL = reverse('recipe:ingredient-list')
+INGREDIENT_AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 
 
 class PublicIngredientAPITests(APITestCase):
@@ -35,7 +36,7 @@ class PrivateIngredientAPITests(APITestCase):
         resp = self.client.get(INGREDIENT_URL)
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(resp.data['results'], serializer.data)
 
     def test_get_ingredients_limit_to_user(self):
         other_user = get_user_model().objects.create_user(
@@ -51,7 +52,7 @@ class PrivateIngredientAPITests(APITestCase):
 
         resp = self.client.get(INGREDIENT_URL)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(resp.data['results'], serializer.data)
 
     def test_create_ingredient_api(self):
         resp = self.client.post(INGREDIENT_URL, data={'name': 'Apple'})
@@ -60,3 +61,30 @@ class PrivateIngredientAPITests(APITestCase):
     def test_create_ingredient_api_invalid_name(self):
         resp = self.client.post(INGREDIENT_URL, data={'name': ''})
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete(self):
+        for name in ('Tomato', 'tofu', 'Salt'):
+            Ingredient.objects.create(name=name, user=self.user)
+
+        resp = self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'prefix': 'TO'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([i['name'] for i in resp.data], ['tofu', 'Tomato'])
+
+    def test_ingredients_ordered_by_usage(self):
+        salt = Ingredient.objects.create(name='Salt', user=self.user)
+        tofu = Ingredient.objects.create(name='Tofu', user=self.user)
+        Ingredient.objects.create(name='Saffron', user=self.user)
+        for i, ingredients in enumerate(([salt, tofu], [salt])):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5, price=1
+            ).ingredients.set(ingredients)
+
+        resp = self.client.get(INGREDIENT_URL, {'ordering': '-usage'})
+        self.assertEqual(
+            [(i['name'], i['usage']) for i in resp.data['results']],
+            [('Salt', 2), ('Tofu', 1), ('Saffron', 0)]
+        )
+
+        resp = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+        self.assertEqual([i['name'] for i in resp.data['results']],
+                         ['Tofu', 'Salt'])
@@ -1,17 +1,40 @@
+import base64
+import csv
+import io
+import json
 import tempfile
+import time
 import os
+from datetime import timedelta
+from unittest.mock import patch
+from urllib.parse import urlencode
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from django.urls import reverse
+from django.utils.http import http_date
 
-from core.models import Recipe, Tag, Ingredient
+from core import stats, synthetic
+from core.models import CollectionVersion, Recipe, RecipeStat, Tag, \
+    Ingredient
 from recipe.serializer import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import RecipeViewSet, related_id_prefetches
 
 RECIPE_LIST_URL = reverse('recipe:recipe-list')
+RECIPE_BATCH_URL = reverse('recipe:recipe-batch')
+RECIPE_SEARCH_URL = reverse('recipe:recipe-search')
+RECIPE_STREAM_URL = reverse('recipe:recipe-stream')
+RECIPE_EXPORT_URL = reverse('recipe:recipe-export')
+RECIPE_IMPORT_URL = reverse('recipe:recipe-import')
+RECIPE_STATS_URL = reverse('recipe:recipe-stats')
 
 
 def image_upload_url(recipe_id):
@@ -33,6 +56,12 @@ def sample_recipe(user, **params):
     return Recipe.objects.create(user=user, **defaults)
 
 
+def cursor(position):
+    """A ``?cursor=`` value for a page after ``position``."""
+    return base64.b64encode(
+        urlencode({'p': json.dumps(position)}).encode()).decode()
+
+
 def sample_tag(user, name='Sample Tag'):
     return Tag.objects.create(user=user, name=name)
 
@@ -64,7 +93,7 @@ class PrivateRecipeAPITests(APITestCase):
         resp = self.client.get(RECIPE_LIST_URL)
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(resp.data['results'], serializer.data)
 
     def test_retrieve_recipes_limited_to_user(self):
         user2 = get_user_model().objects.create_user(
@@ -79,7 +108,132 @@ class PrivateRecipeAPITests(APITestCase):
 
         resp = self.client.get(RECIPE_LIST_URL)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(resp.data['results'], serializer.data)
+
+    def test_retrieve_recipes_paginated(self):
+        recipes = [sample_recipe(self.user) for _ in range(3)]
+
+        resp = self.client.get(RECIPE_LIST_URL, {'limit': 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in resp.data['results']],
+            [recipes[2].id, recipes[1].id]
+        )
+        self.assertIsNone(resp.data['previous'])
+
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual(
+            [r['id'] for r in resp.data['results']],
+            [recipes[0].id]
+        )
+        self.assertIsNone(resp.data['next'])
+        self.assertIsNotNone(resp.data['previous'])
+
+    def test_list_query_count_independent_of_page_size(self):
+        tag = sample_tag(self.user)
+        ingredient = sample_ingredient(self.user)
+        for _ in range(5):
+            recipe = sample_recipe(self.user)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        with CaptureQueriesContext(connection) as small_page:
+            self.client.get(RECIPE_LIST_URL, {'limit': 1})
+        with CaptureQueriesContext(connection) as large_page:
+            resp = self.client.get(RECIPE_LIST_URL, {'limit': 5})
+
+        self.assertEqual(len(resp.data['results']), 5)
+        self.assertEqual(len(small_page), len(large_page))
+
+    def test_detail_query_count(self):
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(sample_tag(self.user), sample_tag(self.user, 'Two'))
+        recipe.ingredients.add(sample_ingredient(self.user))
+
+        with self.assertNumQueries(3):
+            self.client.get(recipe_url_detail(recipe.id))
+
+    def test_list_rows_match_serializer(self):
+        tags = [sample_tag(self.user, name) for name in ('A', 'B', 'C')]
+        for i in range(3):
+            recipe = sample_recipe(self.user, title=f'Recipe {i}',
+                                   price='1.50')
+            recipe.tags.add(tags[2], tags[0])
+            recipe.ingredients.add(sample_ingredient(self.user))
+        sample_recipe(self.user, title='No relations')
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(RECIPE_LIST_URL)
+
+        serializer = RecipeSerializer(
+            Recipe.objects.order_by('-id').prefetch_related(
+                *related_id_prefetches()),
+            many=True
+        )
+        self.assertEqual(JSONRenderer().render(resp.data['results']),
+                         JSONRenderer().render(serializer.data))
+        self.assertFalse(any(
+            q['sql'].startswith('SELECT "core_tag"') for q in queries))
+
+    def test_list_selected_fields(self):
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(sample_tag(self.user))
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(RECIPE_LIST_URL, {'fields': 'id,title'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['results'],
+                         [{'id': recipe.id, 'title': recipe.title}])
+        self.assertFalse(any('core_recipe_tags' in q['sql'] for q in queries))
+        recipe_query = next(
+            q['sql'] for q in queries if 'FROM "core_recipe"' in q['sql'])
+        self.assertNotIn('"price"', recipe_query)
+
+    def test_list_selected_fields_paginated(self):
+        recipes = [sample_recipe(self.user, title=f'Recipe {i}')
+                   for i in range(3)]
+
+        resp = self.client.get(RECIPE_LIST_URL,
+                               {'fields': 'title', 'limit': 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['results'],
+                         [{'title': 'Recipe 2'}, {'title': 'Recipe 1'}])
+
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['results'], [{'title': recipes[0].title}])
+        self.assertIsNone(resp.data['next'])
+
+    def test_list_expanded_relations(self):
+        recipe = sample_recipe(self.user)
+        tag = sample_tag(self.user)
+        ingredient = sample_ingredient(self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        resp = self.client.get(RECIPE_LIST_URL, {'expand': 'tags'})
+
+        result = resp.data['results'][0]
+        self.assertEqual(result['tags'], [{'id': tag.id, 'name': tag.name}])
+        self.assertEqual(result['ingredients'], [ingredient.id])
+
+    def test_detail_without_expansion(self):
+        recipe = sample_recipe(self.user)
+        tag = sample_tag(self.user)
+        recipe.tags.add(tag)
+
+        resp = self.client.get(recipe_url_detail(recipe.id),
+                               {'expand': '', 'fields': 'id,tags'})
+
+        self.assertEqual(resp.data, {'id': recipe.id, 'tags': [tag.id]})
+
+    def test_unknown_fields_rejected(self):
+        resp = self.client.get(RECIPE_LIST_URL, {'fields': 'id,user'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(RECIPE_LIST_URL, {'expand': 'user'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_view_recipe_detail(self):
         recipe = sample_recipe(user=self.user)
@@ -174,7 +328,742 @@ class PrivateRecipeAPITests(APITestCase):
         self.assertEqual(recipe.tags.count(), 0)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_filter_by_tags_returns_distinct_recipes(self):
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Vegetarian')
+        recipe.tags.add(tag1, tag2)
+
+        resp = self.client.get(
+            RECIPE_LIST_URL,
+            {'tags': f'{tag1.id},{tag2.id}'}
+        )
+
+        self.assertEqual(
+            [r['id'] for r in resp.data['results']], [recipe.id])
+
+    def test_filter_by_tags_match_all(self):
+        recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
+        recipe2 = sample_recipe(user=self.user, title='Aubergine with tahini')
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Spicy')
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
+
+        resp = self.client.get(
+            RECIPE_LIST_URL,
+            {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        )
+
+        self.assertEqual(
+            [r['id'] for r in resp.data['results']], [recipe1.id])
+
+    def test_filter_excluding_tags_and_ingredients(self):
+        recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
+        recipe2 = sample_recipe(user=self.user, title='Fish and chips')
+        recipe3 = sample_recipe(user=self.user, title='Steak')
+        tag = sample_tag(user=self.user, name='Vegan')
+        ingredient = sample_ingredient(user=self.user, name='Beef')
+        recipe1.tags.add(tag)
+        recipe2.tags.add(tag)
+        recipe2.ingredients.add(ingredient)
+
+        resp = self.client.get(
+            RECIPE_LIST_URL,
+            {'tags': tag.id, 'exclude_ingredients': ingredient.id}
+        )
+        self.assertEqual(
+            [r['id'] for r in resp.data['results']], [recipe1.id])
+
+        resp = self.client.get(RECIPE_LIST_URL, {'exclude_tags': tag.id})
+        self.assertEqual(
+            [r['id'] for r in resp.data['results']], [recipe3.id])
+
+    def test_filter_invalid_parameters(self):
+        resp = self.client.get(RECIPE_LIST_URL, {'tags': '1,abc'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(RECIPE_LIST_URL, {'match': 'some'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_by_price_and_time(self):
+        for title, price, minutes in (('Curry', 9, 40), ('Toast', 2, 5),
+                                      ('Salad', 6, 10), ('Soup', 6, 30),
+                                      ('Steak', 25, 20)):
+            sample_recipe(self.user, title=title, price=price,
+                          time_minutes=minutes)
+
+        titles = []
+        resp = self.client.get(RECIPE_LIST_URL, {
+            'price_max': '9.99', 'time_max': 30, 'ordering': 'price',
+            'limit': 1
+        })
+        while True:
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            titles += [r['title'] for r in resp.data['results']]
+            if not resp.data['next']:
+                break
+            resp = self.client.get(resp.data['next'])
+        self.assertEqual(titles, ['Toast', 'Salad', 'Soup'])
+
+        resp = self.client.get(RECIPE_LIST_URL, {
+            'price_min': 6, 'ordering': '-time_minutes'})
+        self.assertEqual([r['title'] for r in resp.data['results']],
+                         ['Curry', 'Soup', 'Steak', 'Salad'])
+
+    def test_filter_invalid_ranges(self):
+        for params in ({'price_min': '-1'}, {'price_max': 'cheap'},
+                       {'price_max': 'NaN'}, {'time_max': '1.5'},
+                       {'ordering': 'title'}):
+            resp = self.client.get(RECIPE_LIST_URL, params)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_orderings_page_over_ties_without_offset(self):
+        recipes = [
+            sample_recipe(self.user, title=f'Recipe {i}', price=price)
+            for i, price in enumerate((4, 4, 3, 4, 4, 3, 4))
+        ]
+
+        for ordering in ('price', '-price'):
+            expected = [
+                r.id for r in sorted(
+                    recipes, key=lambda r: (r.price, r.id),
+                    reverse=ordering.startswith('-'))
+            ]
+            pages = []
+            resp = self.client.get(RECIPE_LIST_URL, {
+                'ordering': ordering, 'fields': 'id,title', 'limit': 2})
+            while True:
+                self.assertEqual(resp.status_code, status.HTTP_200_OK)
+                pages.append([r['id'] for r in resp.data['results']])
+                if not resp.data['next']:
+                    break
+                with CaptureQueriesContext(connection) as queries:
+                    resp = self.client.get(resp.data['next'])
+                self.assertFalse(any(
+                    'OFFSET' in q['sql'] for q in queries))
+            self.assertEqual(sum(pages, []), expected)
+
+            backwards = []
+            while resp.data['previous']:
+                resp = self.client.get(resp.data['previous'])
+                backwards.insert(0, [r['id'] for r in resp.data['results']])
+            self.assertEqual(backwards, pages[:-1])
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(RECIPE_LIST_URL, {
+            'ordering': 'price', 'cursor': 'cD1bMV0='})
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_cursor_positions(self):
+        for ordering, fields in RecipeViewSet.orderings.items():
+            positions = [[1] * (len(fields) + 1)]
+            for i, field in enumerate(fields):
+                for value in ('abc', None, [1], 'Infinity'):
+                    positions.append(
+                        [1] * i + [value] + [1] * (len(fields) - i - 1))
+            for position in positions:
+                with self.subTest(ordering=ordering, position=position):
+                    resp = self.client.get(RECIPE_LIST_URL, {
+                        'ordering': ordering, 'cursor': cursor(position)})
+                    self.assertEqual(
+                        resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeRangeIndexTests(APITestCase):
+
+    def test_filters_and_orderings_use_indexes(self):
+        with connection.cursor() as cursor:
+            user_id = synthetic.seed(cursor, users=10, recipes=2000,
+                                     tags=5, ingredients=5, links=1)[0]
+            cursor.execute('ANALYZE')
+        self.client.force_authenticate(
+            get_user_model().objects.get(pk=user_id))
+
+        ranges = ({}, {'price_min': 5, 'price_max': 10}, {'time_max': 30},
+                  {'price_max': 10, 'time_max': 30})
+        for ordering in RecipeViewSet.orderings:
+            for params in ranges:
+                with self.subTest(ordering=ordering, **params):
+                    self.assert_pages_use_indexes(
+                        dict(params, ordering=ordering, limit=20))
+
+    def assert_pages_use_indexes(self, params):
+        """The first two pages, the second starting at a cursor."""
+        indexes = r'core_recipe_user_\w+_idx'
+        ordering = params['ordering']
+        url = RECIPE_LIST_URL
+        for page in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(url, params)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            sql = next(q['sql'] for q in queries if 'ORDER BY' in q['sql'])
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+            self.assertRegex(plan, rf'Index Scan.* {indexes}')
+            self.assertNotIn('Seq Scan on core_recipe ', plan)
+            self.assertNotIn('OFFSET', sql)
+
+            if ordering == '-id':
+                # After an id cursor, a range scan of the primary key
+                # reads the page rows without a sort as well.
+                indexes = rf'({indexes}|core_recipe_pkey)'
+            url, params = resp.data['next'], None
+
+
+class RecipeBatchTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'foo@bar.gr',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = sample_tag(self.user)
+        self.ingredient = sample_ingredient(self.user)
+
+    def payload(self, count, **params):
+        item = {
+            'title': 'Sample recipe',
+            'price': '5.00',
+            'time_minutes': 10,
+            'tags': [self.tag.id],
+            'ingredients': [self.ingredient.id],
+        }
+        item.update(params)
+        return [dict(item, title=f'Recipe {i}') for i in range(count)]
+
+    def test_batch_create(self):
+        with CaptureQueriesContext(connection) as small_batch:
+            self.client.post(RECIPE_BATCH_URL, self.payload(2),
+                             format='json')
+        with CaptureQueriesContext(connection) as large_batch:
+            resp = self.client.post(RECIPE_BATCH_URL, self.payload(20),
+                                    format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(small_batch), len(large_batch))
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 22)
+        recipe = Recipe.objects.get(id=resp.data[0]['id'])
+        self.assertEqual(resp.data[0], RecipeSerializer(recipe).data)
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+        self.assertEqual(list(recipe.ingredients.all()), [self.ingredient])
+
+    def test_batch_all_or_nothing(self):
+        other_tag = sample_tag(get_user_model().objects.create_user(
+            'other@bar.gr', 'test123'))
+        payload = self.payload(2)
+        payload[1]['tags'] = [other_tag.id]
+
+        resp = self.client.post(RECIPE_BATCH_URL, payload, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data[0], {})
+        self.assertIn('tags', resp.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_batch_per_item_errors(self):
+        payload = self.payload(3)
+        payload[1]['price'] = 'free'
+
+        resp = self.client.post(
+            f'{RECIPE_BATCH_URL}?atomic=false', payload, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertIn('price', resp.data[1]['errors'])
+        self.assertEqual(
+            [resp.data[0]['title'], resp.data[2]['title']],
+            ['Recipe 0', 'Recipe 2']
+        )
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_batch_size_limited(self):
+        resp = self.client.post(RECIPE_BATCH_URL, self.payload(501),
+                                format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_batch_changes_list_etag(self):
+        etag = self.client.get(RECIPE_LIST_URL)['ETag']
+        self.client.post(RECIPE_BATCH_URL, self.payload(1), format='json')
+
+        resp = self.client.get(RECIPE_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+
+class ConditionalRecipeListTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'foo@bar.gr',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(self.user)
+
+    def age_versions(self, seconds):
+        CollectionVersion.objects.update(
+            modified=F('modified') - timedelta(seconds=seconds))
+
+    def test_unchanged_list_not_modified(self):
+        self.age_versions(2)
+        resp = self.client.get(RECIPE_LIST_URL)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', resp)
+
+        resp = self.client.get(
+            RECIPE_LIST_URL, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(
+                RECIPE_LIST_URL, HTTP_IF_NONE_MATCH=resp['ETag'])
+
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('ETag', resp)
+
+    def test_no_last_modified_within_the_second_of_a_write(self):
+        # As if the last write was later in the current second.
+        self.age_versions(-5)
+
+        resp = self.client.get(RECIPE_LIST_URL)
+        self.assertNotIn('Last-Modified', resp)
+
+        since = http_date(time.time() + 10)
+        resp = self.client.get(RECIPE_LIST_URL, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['results']), 1)
+
+    def test_etag_depends_on_query(self):
+        resp1 = self.client.get(RECIPE_LIST_URL)
+        resp2 = self.client.get(RECIPE_LIST_URL, {'limit': 1})
+
+        self.assertNotEqual(resp1['ETag'], resp2['ETag'])
+
+    def test_writes_change_etag(self):
+        etag = self.client.get(RECIPE_LIST_URL)['ETag']
+
+        self.client.patch(
+            recipe_url_detail(self.recipe.id), {'title': 'New title'})
+        resp = self.client.get(RECIPE_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        etag = resp['ETag']
 
+        self.recipe.tags.add(sample_tag(self.user))
+        resp = self.client.get(RECIPE_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        etag = resp['ETag']
+
+        self.client.delete(recipe_url_detail(self.recipe.id))
+        resp = self.client.get(RECIPE_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['results'], [])
+
+
+class RecipeStreamTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'foo@bar.gr',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+        tag = sample_tag(self.user)
+        for i in range(5):
+            recipe = sample_recipe(self.user, title=f'Recipe {i}')
+            recipe.tags.add(tag)
+
+    def stream(self, **params):
+        resp = self.client.get(RECIPE_STREAM_URL, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        return b''.join(resp.streaming_content)
+
+    @patch('recipe.views.RecipeViewSet.stream_chunk_size', 2)
+    def test_stream_matches_list(self):
+        listed = self.client.get(RECIPE_LIST_URL).data['results']
+
+        self.assertEqual(self.stream(), JSONRenderer().render(listed))
+
+    @patch('recipe.views.RecipeViewSet.stream_chunk_size', 2)
+    def test_stream_expanded(self):
+        listed = self.client.get(
+            RECIPE_LIST_URL, {'expand': 'tags'}).data['results']
+
+        self.assertEqual(self.stream(expand='tags'),
+                         JSONRenderer().render(listed))
+
+    def test_stream_empty(self):
+        self.assertEqual(self.stream(tags='0'), b'[]')
+
+    def test_stream_conditional(self):
+        etag = self.client.get(RECIPE_STREAM_URL)['ETag']
+
+        resp = self.client.get(RECIPE_STREAM_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class RecipeExportTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'foo@bar.gr',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(self.user, title='Curry, "spicy"')
+        self.recipe.tags.add(sample_tag(self.user, 'Vegan'),
+                             sample_tag(self.user, 'Dinner'))
+        sample_recipe(self.user, title='Toast')
+        sample_recipe(
+            get_user_model().objects.create_user('other@bar.gr', 'test'))
+
+    def export(self, **params):
+        resp = self.client.get(RECIPE_EXPORT_URL, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp, b''.join(resp.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp, body = self.export()
+
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.ndjson', resp['Content-Disposition'])
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0], {
+            'id': self.recipe.id,
+            'title': 'Curry, "spicy"',
+            'time_minutes': 10,
+            'price': '5.00',
+            'link': '',
+            'tags': ['Dinner', 'Vegan'],
+            'ingredients': [],
+        })
+        self.assertEqual(len(queries), 1)
+
+    def test_export_csv(self):
+        resp, body = self.export(fmt='csv')
+
+        self.assertEqual(resp['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(rows[0], ['id', 'title', 'time_minutes', 'price',
+                                   'link', 'tags', 'ingredients'])
+        self.assertEqual(rows[1], [str(self.recipe.id), 'Curry, "spicy"',
+                                   '10', '5.00', '', '["Dinner", "Vegan"]',
+                                   '[]'])
+        self.assertEqual(len(rows), 3)
+
+    def test_export_invalid_format(self):
+        resp = self.client.get(RECIPE_EXPORT_URL, {'fmt': 'xml'})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeImportTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'foo@bar.gr',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = sample_tag(self.user, 'Vegan')
+
+    def upload(self, content, name='recipes.ndjson', **params):
+        upload = io.BytesIO(content.encode())
+        upload.name = name
+        url = RECIPE_IMPORT_URL
+        if params:
+            url += '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        resp = self.client.post(url, {'file': upload}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return [json.loads(line) for line in
+                b''.join(resp.streaming_content).decode().splitlines()]
+
+    def test_import_ndjson(self):
+        events = self.upload('\n'.join([
+            json.dumps({'title': 'Curry', 'time_minutes': 30,
+                        'price': '7.50', 'tags': ['vegan', 'Dinner'],
+                        'ingredients': ['Rice']}),
+            '',
+            json.dumps({'title': 'Toast', 'time_minutes': 2,
+                        'price': 1}),
+        ]))
+
+        self.assertEqual(events, [
+            {'processed': 2, 'created': 2, 'failed': 0},
+            {'processed': 2, 'created': 2, 'failed': 0, 'done': True},
+        ])
+        curry = Recipe.objects.get(user=self.user, title='Curry')
+        self.assertEqual(
+            sorted(curry.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'])
+        self.assertIn(self.vegan, curry.tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            list(curry.ingredients.values_list('name', flat=True)), ['Rice'])
+
+    def test_import_reports_invalid_lines(self):
+        events = self.upload('\n'.join([
+            json.dumps({'title': 'Curry', 'time_minutes': 30,
+                        'price': '7.50'}),
+            'not json',
+            json.dumps({'title': 'Toast', 'price': 'cheap',
+                        'time_minutes': 2, 'tags': 'Vegan'}),
+        ]))
+
+        self.assertEqual(events[0], {
+            'line': 2, 'errors': {'non_field_errors': ['Malformed record.']}
+        })
+        self.assertEqual(events[1]['line'], 3)
+        self.assertEqual(set(events[1]['errors']), {'price', 'tags'})
+        self.assertEqual(events[-1], {
+            'processed': 3, 'created': 1, 'failed': 2, 'done': True
+        })
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_import_csv_round_trip(self):
+        recipe = sample_recipe(self.user, title='Curry, "spicy"')
+        recipe.tags.add(self.vegan)
+        export = b''.join(self.client.get(
+            RECIPE_EXPORT_URL, {'fmt': 'csv'}).streaming_content).decode()
+        recipe.delete()
+
+        events = self.upload(export, name='recipes.csv')
+
+        self.assertEqual(events[-1]['created'], 1)
+        imported = Recipe.objects.get(user=self.user)
+        self.assertEqual(imported.title, 'Curry, "spicy"')
+        self.assertEqual(list(imported.tags.all()), [self.vegan])
+
+    def test_import_in_batches(self):
+        content = '\n'.join(
+            json.dumps({'title': f'Recipe {i}', 'time_minutes': 1,
+                        'price': 1})
+            for i in range(5)
+        )
+        with patch('recipe.views.RecipeViewSet.import_batch_size', 2):
+            events = self.upload(content)
+
+        self.assertEqual([e['created'] for e in events], [2, 4, 5, 5])
+
+    def test_import_requires_file(self):
+        resp = self.client.post(RECIPE_IMPORT_URL, {}, format='multipart')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IMPORT_UPLOAD_MAX_SIZE=10)
+    def test_import_too_large(self):
+        upload = io.BytesIO(b'{"title": "Curry"}\n' * 10)
+        upload.name = 'recipes.ndjson'
+        resp = self.client.post(
+            RECIPE_IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(resp.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class RecipeStatsTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'foo@bar.gr',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = sample_tag(self.user, 'Vegan')
+        self.dinner = sample_tag(self.user, 'Dinner')
+        self.rice = sample_ingredient(self.user, 'Rice')
+
+    def assert_consistent(self):
+        """The incrementally maintained rows and usage counters match
+        a rebuild.
+        """
+        rows = RecipeStat.objects.values_list('user', 'kind', 'key', 'count')
+        maintained = set(rows)
+        self.assertEqual(stats.rebuild()[1], 0)
+        self.assertEqual(maintained, set(rows.all()))
+
+    def test_stats(self):
+        for price, minutes in ((4, 10), (6, 25), (11, 25), (20, 90)):
+            recipe = sample_recipe(
+                self.user, price=price, time_minutes=minutes)
+            recipe.tags.add(self.vegan)
+        recipe.tags.add(self.dinner)
+        recipe.ingredients.add(self.rice)
+        sample_recipe(get_user_model().objects.create_user(
+            'other@bar.gr', 'test'))
+
+        resp = self.client.get(RECIPE_STATS_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, {
+            'recipes': 4,
+            'price': {'average': '10.25', 'median': '8.50'},
+            'time_minutes': {
+                'median': 25.0,
+                'distribution': [
+                    {'max': 15, 'recipes': 1},
+                    {'max': 30, 'recipes': 2},
+                    {'max': 60, 'recipes': 0},
+                    {'max': 120, 'recipes': 1},
+                    {'max': None, 'recipes': 0},
+                ],
+            },
+            'tags': [
+                {'id': self.vegan.id, 'name': 'Vegan', 'recipes': 4},
+                {'id': self.dinner.id, 'name': 'Dinner', 'recipes': 1},
+            ],
+            'ingredients': [
+                {'id': self.rice.id, 'name': 'Rice', 'recipes': 1},
+            ],
+        })
+        self.assert_consistent()
+
+    def test_stats_empty(self):
+        resp = self.client.get(RECIPE_STATS_URL)
+
+        self.assertEqual(resp.data['recipes'], 0)
+        self.assertEqual(resp.data['price'],
+                         {'average': None, 'median': None})
+        self.assertEqual(resp.data['tags'], [])
+
+    def test_stats_follow_writes(self):
+        recipe = sample_recipe(self.user)
+        other = sample_recipe(self.user, price=8)
+        recipe.tags.add(self.vegan, self.dinner)
+        self.vegan.recipe_set.add(other)
+        self.client.patch(recipe_url_detail(recipe.id), {
+            'price': '7.00', 'time_minutes': 45, 'tags': [self.dinner.id]
+        })
+        self.client.put(recipe_url_detail(other.id), {
+            'title': 'Toast', 'price': '8.00', 'time_minutes': 5,
+            'tags': [self.vegan.id, self.dinner.id],
+            'ingredients': [self.rice.id],
+        })
+        self.dinner.recipe_set.remove(recipe, other)
+        self.vegan.recipe_set.clear()
+        other.ingredients.add(self.rice)
+        self.rice.delete()
+        self.assert_consistent()
+
+        self.client.delete(recipe_url_detail(recipe.id))
+        self.dinner.delete()
+        self.assert_consistent()
+        resp = self.client.get(RECIPE_STATS_URL)
+        self.assertEqual(resp.data['recipes'], 1)
+        self.assertEqual(resp.data['tags'], [])
+
+    def test_stats_follow_bulk_writes(self):
+        self.client.post(RECIPE_BATCH_URL, [
+            {'title': 'Curry', 'price': '7.00', 'time_minutes': 30,
+             'tags': [self.vegan.id, self.dinner.id]},
+            {'title': 'Salad', 'price': '7.00', 'time_minutes': 10,
+             'tags': [self.vegan.id], 'ingredients': [self.rice.id]},
+        ], format='json')
+        upload = io.BytesIO(json.dumps(
+            {'title': 'Soup', 'time_minutes': 20, 'price': 3,
+             'tags': ['Vegan', 'Lunch']}).encode())
+        upload.name = 'recipes.ndjson'
+        b''.join(self.client.post(
+            RECIPE_IMPORT_URL, {'file': upload}, format='multipart'
+        ).streaming_content)
+
+        resp = self.client.get(RECIPE_STATS_URL)
+
+        self.assertEqual(resp.data['recipes'], 3)
+        self.assertEqual(resp.data['price']['median'], '7.00')
+        self.assertEqual(resp.data['tags'][0], {
+            'id': self.vegan.id, 'name': 'Vegan', 'recipes': 3})
+        self.assert_consistent()
+
+    def test_stats_conditional(self):
+        sample_recipe(self.user)
+        resp = self.client.get(RECIPE_STATS_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(
+                RECIPE_STATS_URL, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 1)
+
+        self.vegan.name = 'Plants'
+        self.vegan.save()
+        resp = self.client.get(
+            RECIPE_STATS_URL, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+
+class RecipeSearchTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'foo@bar.gr',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def search(self, q, **params):
+        resp = self.client.get(RECIPE_SEARCH_URL, dict(params, q=q))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in resp.data['results']]
+
+    def test_search_ranks_title_above_relations(self):
+        by_ingredient = sample_recipe(self.user, title='Stew')
+        by_ingredient.ingredients.add(
+            sample_ingredient(self.user, name='Tomatoes'))
+        by_tag = sample_recipe(self.user, title='Salad')
+        by_tag.tags.add(sample_tag(self.user, name='Tomato'))
+        sample_recipe(self.user, title='Tomato soup')
+        sample_recipe(self.user, title='Fish and chips')
+
+        self.assertEqual(self.search('tomato'),
+                         ['Tomato soup', 'Salad', 'Stew'])
+
+    def test_search_is_scoped_to_user(self):
+        other = get_user_model().objects.create_user('other@bar.gr', 'test')
+        sample_recipe(other, title='Tomato soup')
+
+        self.assertEqual(self.search('tomato'), [])
+
+    def test_search_with_filters(self):
+        tag = sample_tag(self.user, name='Vegan')
+        vegan = sample_recipe(self.user, title='Bean chili')
+        vegan.tags.add(tag)
+        sample_recipe(self.user, title='Beef chili')
+
+        self.assertEqual(self.search('chili', tags=tag.id), ['Bean chili'])
+
+    def test_search_follows_relation_changes(self):
+        recipe = sample_recipe(self.user, title='Curry')
+        tag = sample_tag(self.user, name='Spicy')
+        recipe.tags.add(tag)
+        self.assertEqual(self.search('spicy'), ['Curry'])
+
+        tag.name = 'Mild'
+        tag.save()
+        self.assertEqual(self.search('spicy'), [])
+        self.assertEqual(self.search('mild'), ['Curry'])
+
+        recipe.tags.remove(tag)
+        self.assertEqual(self.search('mild'), [])
+
+    def test_search_paginates(self):
+        for i in range(3):
+            sample_recipe(self.user, title=f'Soup {i}')
+
+        resp = self.client.get(RECIPE_SEARCH_URL, {'q': 'soup', 'limit': 2})
+        self.assertEqual(resp.data['count'], 3)
+        self.assertEqual(len(resp.data['results']), 2)
+        self.assertIsNotNone(resp.data['next'])
+        self.assertIn('rank', resp.data['results'][0])
+
+    def test_search_requires_query(self):
+        resp = self.client.get(RECIPE_SEARCH_URL, {'q': ' '})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(IMAGE_RENDITIONS_ASYNC=False)
 class RecipeImageUploadTests(APITestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(
@@ -184,8 +1073,20 @@ class RecipeImageUploadTests(APITestCase):
         self.recipe = sample_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for name in self.recipe.image_renditions.values():
+            self.recipe.image.storage.delete(name)
         self.recipe.image.delete()
 
+    def upload(self, img, fmt='JPEG'):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            img.save(ntf, format=fmt)
+            ntf.seek(0)
+            return self.client.post(
+                image_upload_url(self.recipe.id), {'image': ntf},
+                format='multipart'
+            )
+
     def test_upload_image_to_recipe(self):
         url = image_upload_url(self.recipe.id)
         with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
@@ -205,6 +1106,50 @@ class RecipeImageUploadTests(APITestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_upload_image_generates_renditions(self):
+        res = self.upload(Image.new('RGB', (2000, 1000)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(set(self.recipe.image_renditions),
+                         {'thumbnail', 'medium', 'large'})
+
+        path = self.recipe.image.storage.path(
+            self.recipe.image_renditions['thumbnail'])
+        with Image.open(path) as thumbnail:
+            self.assertEqual(thumbnail.size, (160, 80))
+
+        res = self.client.get(recipe_url_detail(self.recipe.id))
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+        self.assertIn('medium', res.data['image_renditions'])
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_upload_image_too_large(self):
+        res = self.upload(Image.effect_noise((200, 200), 64), fmt='PNG')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_upload_image_too_many_pixels(self):
+        res = self.upload(Image.new('RGB', (20, 20)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch('recipe.images.Image')
+    def test_upload_image_rendition_failure(self, mock_image):
+        mock_image.open.side_effect = OSError
+        with self.assertLogs('recipe.images', 'ERROR'):
+            res = self.upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(self.recipe.image_renditions, {})
+
     def test_filter_recipes_by_tags(self):
         recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
         recipe2 = sample_recipe(user=self.user, title='Aubergine with tahini')
@@ -222,9 +1167,9 @@ class RecipeImageUploadTests(APITestCase):
         serializer1 = RecipeSerializer(recipe1)
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
-        self.assertIn(serializer1.data, resp.data)
-        self.assertIn(serializer2.data, resp.data)
-        self.assertNotIn(serializer3.data, resp.data)
+        self.assertIn(serializer1.data, resp.data['results'])
+        self.assertIn(serializer2.data, resp.data['results'])
+        self.assertNotIn(serializer3.data, resp.data['results'])
 
     def test_filter_by_ingredients(self):
         recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
@@ -243,6 +1188,6 @@ class RecipeImageUploadTests(APITestCase):
         serializer1 = RecipeSerializer(recipe1)
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
-        self.assertIn(serializer1.data, resp.data)
-        self.assertIn(serializer2.data, resp.data)
-        self.assertNotIn(serializer3.data, resp.data)
+        self.assertIn(serializer1.data, resp.data['results'])
+        self.assertIn(serializer2.data, resp.data['results'])
+        self.assertNotIn(serializer3.data, resp.data['results'])
@@ -1,12 +1,26 @@
+import base64
+import json
+from urllib.parse import urlencode
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from core.models import Tag
+from core.models import Recipe, Tag
 from recipe.serializer import TagSerializer
 
 TAG_URL = reverse('recipe:tag-list')
+TAG_BULK_URL = reverse('recipe:tag-bulk')
+TAG_AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
+
+
+def cursor(position):
+    """A ``?cursor=`` value for a page after ``position``."""
+    return base64.b64encode(
+        urlencode({'p': json.dumps(position)}).encode()).decode()
 
 
 class PublicTagsAPITests(APITestCase):
@@ -34,7 +48,7 @@ class PrivateTagsAPITests(APITestCase):
         tags = Tag.objects.all()
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(resp.data['results'], serializer.data)
 
     def test_tags_are_limited_to_user(self):
         other_user = get_user_model().objects.create_user(
@@ -46,10 +60,40 @@ class PrivateTagsAPITests(APITestCase):
 
         resp = self.client.get(TAG_URL)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 2)
+        self.assertEqual(len(resp.data['results']), 2)
         tags = Tag.objects.filter(user=self.user).order_by('-name')
-        self.assertEqual(resp.data[0]['name'], tags[0].name)
-        self.assertEqual(resp.data[1]['name'], tags[1].name)
+        self.assertEqual(resp.data['results'][0]['name'], tags[0].name)
+        self.assertEqual(resp.data['results'][1]['name'], tags[1].name)
+
+    def test_tags_paginated_by_name(self):
+        for name in ('Vegan', 'Dessert', 'Fruity'):
+            Tag.objects.create(name=name, user=self.user)
+
+        resp = self.client.get(TAG_URL, {'limit': 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [t['name'] for t in resp.data['results']],
+            ['Vegan', 'Fruity']
+        )
+
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual(
+            [t['name'] for t in resp.data['results']],
+            ['Dessert']
+        )
+        self.assertIsNone(resp.data['next'])
+
+    def test_tags_conditional_get(self):
+        Tag.objects.create(name='Vegan', user=self.user)
+        etag = self.client.get(TAG_URL)['ETag']
+
+        resp = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(TAG_URL, {'name': 'Dessert'})
+        resp = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['results']), 2)
 
     def test_tags_create_success(self):
         payload = {'name': 'Vegan'}
@@ -63,3 +107,215 @@ class PrivateTagsAPITests(APITestCase):
         resp = self.client.post(TAG_URL, payload)
 
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_get_or_create(self):
+        vegan = Tag.objects.create(name='Vegan', user=self.user)
+        other_user = get_user_model().objects.create_user(
+            'another@user.gr', 'pass123'
+        )
+        Tag.objects.create(name='Dessert', user=other_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(
+                TAG_BULK_URL,
+                {'names': ['vegan', ' Dessert ', 'Quick  meal', 'dessert']},
+                format='json'
+            )
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        tag_queries = [q for q in queries if '"core_tag"' in q['sql']]
+        self.assertEqual(len(tag_queries), 2)
+        self.assertEqual(
+            [t['name'] for t in resp.data],
+            ['Vegan', 'Dessert', 'Quick meal']
+        )
+        self.assertEqual(resp.data[0]['id'], vegan.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+        resp = self.client.post(
+            TAG_BULK_URL, {'names': ['DESSERT']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_matches_names_as_the_database_lowercases_them(self):
+        # str.lower() turns the dotted capital I into two characters.
+        istanbul = Tag.objects.create(name='İstanbul', user=self.user)
+
+        resp = self.client.post(
+            TAG_BULK_URL, {'names': ['İstanbul']}, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data[0]['id'], istanbul.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_waits_for_bulk_creates(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(TAG_URL, {'name': 'Vegan'})
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        lock, insert = [
+            i for i, q in enumerate(queries)
+            if 'pg_advisory_xact_lock' in q['sql'] or
+            q['sql'].startswith('INSERT INTO "core_tag"')
+        ]
+        self.assertLess(lock, insert)
+        self.assertIn('pg_advisory_xact_lock', queries[lock]['sql'])
+
+    def test_bulk_invalid_names(self):
+        resp = self.client.post(TAG_BULK_URL, {'names': []}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.post(TAG_BULK_URL, {'names': [' ']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete(self):
+        for name in ('Vegetarian', 'vegan', 'Veg_gie', 'Dessert', 'Vega'):
+            Tag.objects.create(name=name, user=self.user)
+        other = get_user_model().objects.create_user('other@bar.gr', 'test')
+        Tag.objects.create(name='Vegetables', user=other)
+
+        resp = self.client.get(TAG_AUTOCOMPLETE_URL, {'prefix': 'VEGA'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in resp.data],
+                         ['Vega', 'vegan'])
+
+        resp = self.client.get(TAG_AUTOCOMPLETE_URL,
+                               {'prefix': 'veg', 'limit': 2})
+        self.assertEqual(len(resp.data), 2)
+
+        resp = self.client.get(TAG_AUTOCOMPLETE_URL, {'prefix': 'veg_'})
+        self.assertEqual([tag['name'] for tag in resp.data], ['Veg_gie'])
+
+    def test_autocomplete_invalid_params(self):
+        resp = self.client.get(TAG_AUTOCOMPLETE_URL)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(TAG_AUTOCOMPLETE_URL,
+                               {'prefix': 'veg', 'limit': 500})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_uses_prefix_index(self):
+        Tag.objects.bulk_create(
+            Tag(name=f'Tag {i}', user=self.user) for i in range(1000))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_tag')
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(TAG_AUTOCOMPLETE_URL, {'prefix': 'veg'})
+            sql = next(q['sql'] for q in queries if 'LIKE' in q['sql'])
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('core_tag_user_name_prefix_idx', plan)
+
+    def link(self, tag, count):
+        for i in range(count):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5, price=1
+            ).tags.add(tag)
+
+    def test_tags_ordered_by_usage(self):
+        vegan = Tag.objects.create(name='Vegan', user=self.user)
+        dessert = Tag.objects.create(name='Dessert', user=self.user)
+        fruity = Tag.objects.create(name='Fruity', user=self.user)
+        Tag.objects.create(name='Unused', user=self.user)
+        self.link(dessert, 3)
+        self.link(vegan, 1)
+        self.link(fruity, 1)
+
+        resp = self.client.get(TAG_URL, {'ordering': '-usage', 'limit': 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(t['name'], t['usage']) for t in resp.data['results']],
+            [('Dessert', 3), ('Fruity', 1)]
+        )
+
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual(
+            [(t['name'], t['usage']) for t in resp.data['results']],
+            [('Vegan', 1), ('Unused', 0)]
+        )
+
+    def test_tags_malformed_usage_cursor(self):
+        Tag.objects.create(name='Vegan', user=self.user)
+
+        for position in (['abc', 1], [1, 'abc'], [None, 1], [[1], 1], [1]):
+            with self.subTest(position=position):
+                resp = self.client.get(TAG_URL, {
+                    'ordering': '-usage', 'cursor': cursor(position)})
+                self.assertEqual(
+                    resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_assigned_only(self):
+        vegan = Tag.objects.create(name='Vegan', user=self.user)
+        Tag.objects.create(name='Dessert', user=self.user)
+        self.link(vegan, 1)
+
+        resp = self.client.get(TAG_URL, {'assigned_only': 1})
+        self.assertEqual([t['name'] for t in resp.data['results']], ['Vegan'])
+
+        Recipe.objects.get().delete()
+        resp = self.client.get(TAG_URL, {'assigned_only': 1})
+        self.assertEqual(resp.data['results'], [])
+
+    def test_tags_invalid_ordering(self):
+        resp = self.client.get(TAG_URL, {'ordering': 'user'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(TAG_URL, {'assigned_only': 'yes'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_usage_follows_recipe_writes(self):
+        vegan = Tag.objects.create(name='Vegan', user=self.user)
+        self.link(vegan, 2)
+        etag = self.client.get(TAG_URL)['ETag']
+        recipe = Recipe.objects.first()
+
+        recipe.tags.remove(vegan)
+        vegan.name = 'Plants'
+        vegan.save()
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.usage, 1)
+
+        vegan.recipe_set.add(recipe)
+        vegan.recipe_set.add(recipe)
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.usage, 2)
+
+        recipe.tags.clear()
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.usage, 1)
+
+        resp = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['results'][0]['usage'], 1)
+
+    def test_usage_ordering_uses_index(self):
+        Tag.objects.bulk_create(
+            Tag(name=f'Tag {i}', user=self.user) for i in range(1000))
+        self.link(Tag.objects.get(name='Tag 10'), 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_tag')
+
+        # Deep pages of the unused tags, which all tie on the usage.
+        names = []
+        resp = self.client.get(TAG_URL, {'ordering': '-usage', 'limit': 100})
+        for _ in range(4):
+            names += [t['name'] for t in resp.data['results']]
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(resp.data['next'])
+            sql = next(q['sql'] for q in queries if 'usage' in q['sql'])
+            self.assertNotIn('OFFSET', sql)
+        names += [t['name'] for t in resp.data['results']]
+
+        self.assertEqual(names[0], 'Tag 10')
+        self.assertEqual(len(set(names)), 500)
+        self.assertEqual(names[1:], [
+            t.name for t in Tag.objects.exclude(name='Tag 10').order_by(
+                '-id')[:499]
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('core_tag_user_usage_idx', plan)
@@ -1,83 +1,369 @@
-from rest_framework import authentication, mixins, permissions, status, \
-    viewsets
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.db.models.functions import Lower
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from core.models import Ingredient, Recipe, Tag
-from .serializer import IngredientSerializer, RecipeDetailSerializer, \
-    RecipeImageSerializer, RecipeSerializer, TagSerializer
+from core import bulk, exports, imports, metrics, stats
+from core.models import CollectionVersion, Ingredient, Recipe, Tag
+from core.timing import TimedAPIViewMixin
+from user.authentication import CachedTokenAuthentication, \
+    SignedTokenAuthentication
+from . import filters, images, streaming
+from .mixins import ConditionalListMixin, ExportMixin, RowListMixin
+from .pagination import NameCursorPagination, RecipeCursorPagination, \
+    SearchPagination, UsageCursorPagination
+from .serializer import IngredientSerializer, NameListSerializer, \
+    RecipeBatchSerializer, RecipeDetailSerializer, RecipeImageSerializer, \
+    RecipeSearchSerializer, RecipeSerializer, TagSerializer
+
 
+def related_id_prefetches():
+    """Prefetch only the related ids, as needed by RecipeSerializer"""
+    return (
+        Prefetch('tags', queryset=Tag.objects.only('id').order_by('id')),
+        Prefetch('ingredients',
+                 queryset=Ingredient.objects.only('id').order_by('id')),
+    )
 
-class BaseRecipeAttrs(viewsets.GenericViewSet,
+
+class BaseRecipeAttrs(TimedAPIViewMixin,
+                      ConditionalListMixin,
+                      RowListMixin,
+                      ExportMixin,
+                      viewsets.GenericViewSet,
                       mixins.CreateModelMixin,
                       mixins.ListModelMixin):
 
-    authentication_classes = (authentication.TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated, )
+    pagination_class = NameCursorPagination
+    # Pagination of each ?ordering= of the list.
+    orderings = {
+        '-name': NameCursorPagination,
+        '-usage': UsageCursorPagination,
+    }
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
+
+    def list(self, request, *args, **kwargs):
+        """The user's objects by descending name, or the most used first
+        with ``?ordering=-usage``. ``?assigned_only=1`` leaves out the
+        ones no recipe uses.
+        """
+        self.pagination_class = self.orderings[filters.parse_choice(
+            request.query_params, 'ordering', self.orderings, '-name')]
+        return super().list(request, *args, **kwargs)
 
     def get_queryset(self, *args, **kwargs):
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        if filters.parse_flag(self.request.query_params, 'assigned_only'):
+            queryset = queryset.filter(usage__gt=0)
+
+        return queryset.order_by('-name')
+
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """Up to ``limit`` objects whose name starts with ``prefix``,
+        case-insensitively, in name order.
+        """
+        return self.conditional_response(request, self._autocomplete)
+
+    def _autocomplete(self, request):
+        prefix = filters.parse_prefix(request.query_params)
+        limit = filters.parse_limit(
+            request.query_params,
+            self.autocomplete_limit,
+            self.autocomplete_max_limit
+        )
+
+        # Served by the (user_id, lower(name) text_pattern_ops) index.
+        matches = self.queryset.annotate(key=Lower('name')).filter(
+            user=request.user, key__startswith=prefix
+        ).order_by('key', 'id').values('id', 'name')[:limit]
+
+        return Response(list(matches))
 
     def perform_create(self, serializer):
-        return serializer.save(user=self.request.user)
+        # Waits for the bulk creates of the user (see bulk), which must
+        # not miss a name created meanwhile.
+        with transaction.atomic():
+            bulk.lock_user_rows(self.queryset.model, self.request.user)
+            return serializer.save(user=self.request.user)
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Return the objects with the given names, creating the
+        missing ones. Names are matched case-insensitively.
+        """
+        serializer = NameListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        objects, created = bulk.get_or_create_named(
+            self.queryset.model,
+            request.user,
+            serializer.validated_data['names']
+        )
+
+        return Response(
+            self.get_serializer(
+                list(dict.fromkeys(objects.values())), many=True).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
 
 class TagViewSet(BaseRecipeAttrs):
 
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
+    collection = CollectionVersion.TAG
 
 
 class IngredientViewSet(BaseRecipeAttrs):
 
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
+    collection = CollectionVersion.INGREDIENT
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(TimedAPIViewMixin, ConditionalListMixin, RowListMixin,
+                    ExportMixin, viewsets.ModelViewSet):
 
     serializer_class = RecipeSerializer
-    queryset = Recipe.objects.all()
-    authentication_classes = (authentication.TokenAuthentication, )
+    # The search vector is only needed for filtering.
+    queryset = Recipe.objects.defer('search_vector')
+    collection = CollectionVersion.RECIPE
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated, )
+    pagination_class = RecipeCursorPagination
+    batch_max_size = 500
+    import_batch_size = 1000
+    stream_chunk_size = 2000
+    # Actions whose output can be shaped with ?fields= and ?expand=.
+    shaped_actions = ('list', 'retrieve', 'search', 'stream')
+    # Orderings of the list, each served by a (user, ..., id) index.
+    orderings = {
+        '-id': ('-id', ),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'time_minutes': ('time_minutes', 'id'),
+        '-time_minutes': ('-time_minutes', '-id'),
+    }
 
     def get_queryset(self, *args, **kwargs):
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
+        params = self.request.query_params
+        match = filters.parse_match(params)
+
+        queryset = self.queryset.filter(user=self.request.user)
+        for field in ('tags', 'ingredients'):
+            queryset = filters.filter_related(
+                queryset,
+                field,
+                ids=filters.parse_ids(params, field),
+                match=match,
+                exclude=filters.parse_ids(params, f'exclude_{field}')
+            )
+        price_min = filters.parse_number(params, 'price_min', Decimal)
+        if price_min is not None:
+            queryset = queryset.filter(price__gte=price_min)
+        price_max = filters.parse_number(params, 'price_max', Decimal)
+        if price_max is not None:
+            queryset = queryset.filter(price__lte=price_max)
+        time_max = filters.parse_number(params, 'time_max')
+        if time_max is not None:
+            queryset = queryset.filter(time_minutes__lte=time_max)
+
+        if self.action == 'search':
+            query = SearchQuery(filters.parse_search(params),
+                                config=Recipe.SEARCH_CONFIG)
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-id')
+        else:
+            queryset = queryset.order_by(*self.orderings[filters.parse_choice(
+                params, 'ordering', self.orderings, '-id')])
+
+        if self.action in self.shaped_actions:
+            queryset = self.select_requested(queryset)
+
+        return queryset
+
+    def requested_fields(self):
+        return filters.parse_names(
+            self.request.query_params,
+            'fields',
+            self.get_serializer_class().Meta.fields
+        )
 
-        filters = {
-            'user': self.request.user
-        }
+    def expanded_relations(self):
+        expand = filters.parse_names(
+            self.request.query_params, 'expand', bulk.RECIPE_RELATIONS)
+        if expand is None:
+            # Details nest the relations unless asked otherwise.
+            return bulk.RECIPE_RELATIONS if self.action == 'retrieve' else ()
 
-        if tags:
-            filters['tags__id__in'] = [int(_id) for _id in tags.split(',')]
+        return expand
 
-        if ingredients:
-            filters['ingredients__id__in'] = [
-                int(_id) for _id in ingredients.split(',')]
+    def select_requested(self, queryset):
+        """Load only the columns and relations the response includes."""
+        fields = self.requested_fields()
+        expand = self.expanded_relations()
 
-        return self.queryset.filter(**filters).order_by('-id')
+        if fields is not None:
+            # The ordering columns are read by the cursor paginator.
+            columns = {field.name for field in Recipe._meta.concrete_fields}
+            ordering = [name.lstrip('-') for name in queryset.query.order_by]
+            queryset = queryset.only('id', *ordering, *(
+                name for name in fields if name in columns))
+
+        prefetches = []
+        for name, model in (('tags', Tag), ('ingredients', Ingredient)):
+            if fields is not None and name not in fields:
+                continue
+            only = ('id', 'name') if name in expand else ('id', )
+            prefetches.append(Prefetch(
+                name, queryset=model.objects.only(*only).order_by('id')))
+
+        return queryset.prefetch_related(*prefetches)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.shaped_actions:
+            context.update(
+                fields=self.requested_fields(),
+                expand=self.expanded_relations()
+            )
+
+        return context
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return RecipeDetailSerializer
         elif self.action == 'upload_image':
             return RecipeImageSerializer
+        elif self.action == 'batch':
+            return RecipeBatchSerializer
+        elif self.action == 'search':
+            return RecipeSearchSerializer
 
         return self.serializer_class
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(methods=['GET'], detail=False)
+    def search(self, request):
+        """Recipes matching the ``q`` words in their title, tag names or
+        ingredient names, best matches first. Combines with the tag and
+        ingredient filters of the list.
+        """
+        self.pagination_class = SearchPagination
+        return self.list(request)
+
+    @action(methods=['GET'], detail=False)
+    def stream(self, request):
+        """The whole filtered list as a single JSON array, rendered as
+        it is read from the database, for consumers that need every
+        recipe at once.
+        """
+        return self.conditional_response(request, self._stream)
+
+    def _stream(self, request):
+        return StreamingHttpResponse(
+            streaming.json_array(
+                self.get_serializer(),
+                self.filter_queryset(self.get_queryset()),
+                self.stream_chunk_size
+            ),
+            content_type='application/json'
+        )
+
+    @action(methods=['GET'], detail=False)
+    def stats(self, request):
+        """Statistics of the user's library: the number of recipes, the
+        average and median price, the distribution of cooking times and
+        the number of recipes per tag and per ingredient.
+        """
+        return self.conditional_response(request, self._stats)
+
+    def _stats(self, request):
+        return Response(stats.summary(request.user.pk))
+
+    @action(methods=['POST'], detail=False, url_path='import',
+            url_name='import')
+    def import_file(self, request):
+        """Create recipes from an uploaded ``file`` in an ``export``
+        format, given by ``?fmt=`` or the file extension.
+
+        The response streams NDJSON events while the import runs: the
+        errors of each invalid line, and the progress after each batch.
+        """
+        handler = images.BoundedUploadHandler(
+            request, settings.IMPORT_UPLOAD_MAX_SIZE)
+        request.upload_handlers = [handler]
+
+        upload = request.FILES.get('file')
+        if handler.exceeded:
+            return Response(
+                {'file': [_('The file exceeds the maximum upload size.')]},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        if upload is None:
+            raise ValidationError({'file': [_('No file was submitted.')]})
+
+        fmt = filters.parse_choice(
+            request.query_params,
+            'fmt',
+            exports.FORMATS,
+            exports.CSV if upload.name.lower().endswith('.csv')
+            else exports.NDJSON
+        )
+        events = imports.import_recipes(
+            request.user, imports.read(upload, fmt), self.import_batch_size)
+
+        return StreamingHttpResponse(
+            (json.dumps(event) + '\n' for event in events),
+            content_type=exports.FORMATS[exports.NDJSON]
+        )
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
+        """Store the uploaded image and generate its renditions in the
+        background. Their progress is reported in ``image_status``.
+        """
+        handler = images.BoundedUploadHandler(
+            request, settings.IMAGE_UPLOAD_MAX_SIZE)
+        request.upload_handlers = [handler]
+
         recipe = self.get_object()
         serializer = self.get_serializer(
             recipe,
             data=request.data
         )
+        metrics.IMAGE_UPLOAD_SIZE.observe(handler.received)
+        if handler.exceeded:
+            return Response(
+                {'image': [_('The image exceeds the maximum upload size.')]},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(
+                image_status=Recipe.IMAGE_PENDING,
+                image_renditions={}
+            )
+            images.schedule_renditions(recipe)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -87,3 +373,68 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['POST'], detail=False, url_path='batch')
+    def batch(self, request):
+        """Create a list of recipes in a few statements.
+
+        By default the batch is all-or-nothing: if any item is invalid
+        nothing is created and the errors are returned per item. With
+        ``?atomic=false`` the valid items are created and the response
+        holds, per item, either the recipe or its errors.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError(_('Expected a non-empty list of recipes.'))
+        if len(items) > self.batch_max_size:
+            raise ValidationError(
+                _('A batch holds at most %d recipes.') % self.batch_max_size)
+        atomic = request.query_params.get('atomic', 'true') != 'false'
+
+        context = self.get_serializer_context()
+        for field, context_key, model in (
+                ('tags', 'tag_ids', Tag),
+                ('ingredients', 'ingredient_ids', Ingredient)):
+            requested = {
+                pk for item in items if isinstance(item, dict)
+                for pk in item.get(field) or ()
+                if isinstance(pk, int)
+            }
+            context[context_key] = set(model.objects.filter(
+                user=request.user, pk__in=requested
+            ).values_list('pk', flat=True))
+
+        item_serializers = [
+            self.get_serializer_class()(data=item, context=context)
+            for item in items
+        ]
+        valid = [serializer.is_valid() for serializer in item_serializers]
+        if atomic and not all(valid):
+            return Response(
+                [serializer.errors for serializer in item_serializers],
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        recipes = iter(bulk.create_recipes(
+            request.user,
+            [
+                serializer.validated_data
+                for serializer, ok in zip(item_serializers, valid) if ok
+            ]
+        ))
+        results = [
+            next(recipes) if ok else {'errors': serializer.errors}
+            for serializer, ok in zip(item_serializers, valid)
+        ]
+
+        prefetch_related_objects(
+            [r for r in results if isinstance(r, Recipe)],
+            *related_id_prefetches()
+        )
+        return Response(
+            [
+                RecipeSerializer(r).data if isinstance(r, Recipe) else r
+                for r in results
+            ],
+            status=status.HTTP_201_CREATED
+        )
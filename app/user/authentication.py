@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BaseAuthentication, \
+    TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import metrics
+from . import tokens
+
+
+class TokenCache:
+    """A bounded, thread safe LRU cache with a per-entry TTL.
+
+    The cache is local to the process. With ``version``, a function
+    returning a version of the given user shared by the processes, each
+    entry keeps the version of its user when it was added, and is only
+    served while that version is current. Invalidations then reach the
+    other processes too.
+    """
+
+    def __init__(self, maxsize, ttl, version=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._is_current(entry):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def set(self, key, user_id, value):
+        version = self.version(user_id) if self.version else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (
+                time.monotonic() + self.ttl, user_id, version, value)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _is_current(self, entry):
+        expires, user_id, version, _ = entry
+        return expires >= time.monotonic() and (
+            self.version is None or self.version(user_id) == version)
+
+    def _remove(self, key):
+        user_id = self._entries.pop(key)[1]
+        keys = self._keys_by_user[user_id]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_user[user_id]
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_SIZE,
+    settings.TOKEN_CACHE_TTL,
+    tokens.deny_list.version
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement for TokenAuthentication that caches the
+    token's user between requests.
+
+    Only field values are cached; every request gets its own user
+    instance, so views can safely modify ``request.user``.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        metrics.TOKEN_CACHE_LOOKUPS.inc(
+            result='miss' if cached is None else 'hit')
+        if cached is not None:
+            values, created = cached
+            user = get_user_model().from_db(
+                'default', self._user_fields(), values)
+            return user, Token(key=key, user=user, created=created)
+
+        user, token = super().authenticate_credentials(key)
+        values = tuple(getattr(user, name) for name in self._user_fields())
+        token_cache.set(key, user.pk, (values, token.created))
+
+        return user, token
+
+    @staticmethod
+    def _user_fields():
+        return [f.attname for f in get_user_model()._meta.concrete_fields]
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticate ``Authorization: Bearer <access token>`` headers
+    carrying signed access tokens, without touching the database.
+
+    ``request.user`` is an unsaved user instance that only knows its
+    primary key, which is all that per-user querysets need.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed(_('Invalid token header.'))
+
+        try:
+            claims = tokens.load_access_token(auth[1].decode())
+        except (signing.BadSignature, UnicodeError):
+            raise AuthenticationFailed(_('Invalid or expired token.'))
+
+        return get_user_model()(pk=claims['u']), claims
+
+    def authenticate_header(self, request):
+        return self.keyword
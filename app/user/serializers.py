@@ -1,7 +1,13 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model, authenticate
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 
+from core.models import RefreshToken
+
 
 class UserSerializer(serializers.ModelSerializer):
 
@@ -25,11 +31,18 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class AuthTokenSerializer(serializers.Serializer):
+    DATABASE = 'db'
+    SIGNED = 'signed'
+
     email = serializers.EmailField()
     password = serializers.CharField(
         style={'input_type': 'password'},
         trim_whitespace=False,
     )
+    token_type = serializers.ChoiceField(
+        choices=(DATABASE, SIGNED),
+        default=DATABASE
+    )
 
     def validate(self, attrs):
         """Validate and authenticate th user"""
@@ -43,3 +56,22 @@ class AuthTokenSerializer(serializers.Serializer):
             raise serializers.ValidationError(msg, code='authentication')
         attrs['user'] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        """Resolve the refresh token, rejecting expired ones"""
+        expired_before = timezone.now() - timedelta(
+            seconds=settings.REFRESH_TOKEN_LIFETIME)
+        refresh = RefreshToken.objects.select_related('user').filter(
+            key=value,
+            created__gt=expired_before,
+            user__is_active=True
+        ).first()
+
+        if not refresh:
+            msg = _('Invalid or expired refresh token')
+            raise serializers.ValidationError(msg, code='authentication')
+        return refresh
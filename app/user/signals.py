@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import tokens
+from .authentication import token_cache
+
+
+# The local token cache is invalidated at once, the ones of the other
+# processes through the shared user versions of user.tokens.
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+    tokens.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    if kwargs.get('created'):
+        return
+    token_cache.invalidate_user(instance.pk)
+    if kwargs['signal'] is post_delete or not instance.is_active:
+        tokens.revoke_user(instance.pk)
+    else:
+        tokens.invalidate_user(instance.pk)
@@ -0,0 +1,279 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from core import metrics
+from core.models import RefreshToken, TokenRevocation
+from user.authentication import CachedTokenAuthentication, \
+    SignedTokenAuthentication, TokenCache, token_cache
+from user.tokens import SALT, DenyList, deny_list, revoke_user
+
+ME_URL = reverse('user:me')
+TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+REVOKE_URL = reverse('user:token-revoke')
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+
+
+class TokenCacheTests(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = TokenCache(maxsize=2, ttl=60)
+        cache.set('a', 1, 'A')
+        cache.set('b', 2, 'B')
+        cache.get('a')
+        cache.set('c', 3, 'C')
+
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'C')
+
+    @patch('user.authentication.time.monotonic')
+    def test_entries_expire(self, monotonic):
+        cache = TokenCache(maxsize=2, ttl=60)
+        monotonic.return_value = 100
+        cache.set('a', 1, 'A')
+
+        monotonic.return_value = 159
+        self.assertEqual(cache.get('a'), 'A')
+        monotonic.return_value = 161
+        self.assertIsNone(cache.get('a'))
+
+    def test_invalidate_user(self):
+        cache = TokenCache(maxsize=10, ttl=60)
+        cache.set('a', 1, 'A')
+        cache.set('b', 1, 'B')
+        cache.set('c', 2, 'C')
+        cache.invalidate_user(1)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'C')
+
+    def test_hit_ratio(self):
+        cache = TokenCache(maxsize=10, ttl=60)
+        cache.get('a')
+        cache.set('a', 1, 'A')
+        cache.get('a')
+        cache.get('a')
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_ratio'], 2 / 3)
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'foo@bar.gr', 'test123', name='Foo')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_cached_lookup_skips_database(self):
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, self.user.email)
+        self.assertEqual(token.key, self.token.key)
+        self.assertIsNot(
+            user, self.auth.authenticate_credentials(self.token.key)[0])
+
+    def test_lookups_counted_in_metrics(self):
+        def lookups(result):
+            key = metrics.TOKEN_CACHE_LOOKUPS.key(
+                '_total', {'result': result})
+            return metrics.registry.values.collect().get(key, 0)
+
+        hits, misses = lookups('hit'), lookups('miss')
+        for _ in range(3):
+            self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(lookups('hit') - hits, 2)
+        self.assertEqual(lookups('miss') - misses, 1)
+
+    def test_token_delete_invalidates(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_user_deactivation_invalidates(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    @patch('user.tokens.time.monotonic')
+    def test_invalidations_reach_other_processes(self, monotonic):
+        monotonic.return_value = 100
+        other_token = Token.objects.create(user=get_user_model().objects
+                                           .create_user('bar@foo.gr', 'pass'))
+        # The token cache of another worker process.
+        other = TokenCache(
+            maxsize=10, ttl=60, version=DenyList(interval=2).version)
+        key = self.token.key
+        other.set(key, self.user.pk, 'Foo')
+        other.set(other_token.key, other_token.user_id, 'Bar')
+
+        # Only clears this process's cache.
+        self.token.delete()
+
+        self.assertEqual(other.get(key), 'Foo')
+        monotonic.return_value = 102
+        self.assertIsNone(other.get(key))
+        self.assertEqual(other.get(other_token.key), 'Bar')
+
+    @patch('user.tokens.time.monotonic')
+    def test_user_changes_reach_other_processes(self, monotonic):
+        monotonic.return_value = 100
+        other = TokenCache(
+            maxsize=10, ttl=60, version=DenyList(interval=2).version)
+        for user_changes in ({'name': 'Bar'}, {'is_active': False}):
+            other.set(self.token.key, self.user.pk, 'Foo')
+            for name, value in user_changes.items():
+                setattr(self.user, name, value)
+            self.user.save()
+
+            monotonic.return_value += 2
+            self.assertIsNone(other.get(self.token.key))
+
+    def test_profile_update_invalidates(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.get(ME_URL)
+
+        resp = self.client.patch(ME_URL, {'name': 'Bar'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        resp = self.client.get(ME_URL)
+        self.assertEqual(resp.data['name'], 'Bar')
+
+
+class SignedTokenTests(APITestCase):
+
+    def setUp(self):
+        deny_list.reset()
+        self.credentials = {'email': 'foo@bar.gr', 'password': 'test123'}
+        self.user = get_user_model().objects.create_user(**self.credentials)
+
+    def obtain(self):
+        resp = self.client.post(
+            TOKEN_URL, dict(self.credentials, token_type='signed'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def get_recipes(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get(RECIPE_LIST_URL)
+
+    def test_database_token_by_default(self):
+        resp = self.client.post(TOKEN_URL, self.credentials)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(Token.objects.filter(key=resp.data['token']).exists())
+
+    def test_signed_token_authenticates_without_lookups(self):
+        tokens = self.obtain()
+        self.assertIn('refresh', tokens)
+        self.assertNotIn('token', tokens)
+
+        request = APIRequestFactory().get(
+            RECIPE_LIST_URL, HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        # The first check loads the deny-list.
+        SignedTokenAuthentication().authenticate(request)
+        with self.assertNumQueries(0):
+            user, _ = SignedTokenAuthentication().authenticate(request)
+        self.assertEqual(user.pk, self.user.pk)
+
+        resp = self.get_recipes(tokens['access'])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_tampered_token_rejected(self):
+        access = self.obtain()['access']
+        payload, signature = access.rsplit(':', 1)
+
+        resp = self.get_recipes(f'{payload}:{signature[::-1]}')
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @patch('django.core.signing.time.time')
+    def test_expired_token_rejected(self, mock_time):
+        mock_time.return_value = 1000
+        access = self.obtain()['access']
+
+        mock_time.return_value = 1000 + 5 * 60 + 1
+        resp = self.get_recipes(access)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_issues_new_access_token(self):
+        refresh = self.obtain()['refresh']
+
+        resp = self.client.post(REFRESH_URL, {'refresh': refresh})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.get_recipes(resp.data['access']).status_code,
+            status.HTTP_200_OK
+        )
+
+        resp = self.client.post(REFRESH_URL, {'refresh': 'invalid'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_revoke_denies_issued_access_tokens(self):
+        tokens = self.obtain()
+
+        resp = self.client.post(REVOKE_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(RefreshToken.objects.exists())
+        self.assertEqual(
+            self.get_recipes(tokens['access']).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+        resp = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deactivation_denies_issued_access_tokens(self):
+        access = self.obtain()['access']
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(
+            self.get_recipes(access).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+    @patch('user.tokens.time.monotonic')
+    def test_revocations_reach_other_processes(self, monotonic):
+        monotonic.return_value = 100
+        tokens = self.obtain()
+        # The deny-list of another worker process.
+        other = DenyList(interval=2)
+        claims = signing.loads(tokens['access'], salt=SALT)
+        self.assertFalse(other.is_denied(claims))
+
+        self.client.post(REVOKE_URL, {'refresh': tokens['refresh']})
+
+        self.assertFalse(other.is_denied(claims))
+        monotonic.return_value = 102
+        self.assertTrue(other.is_denied(claims))
+
+    def test_expired_revocations_are_deleted(self):
+        with patch('user.tokens.time.time', return_value=1000):
+            revoke_user(self.user.pk)
+        revoke_user(self.user.pk)
+
+        self.assertEqual(TokenRevocation.objects.count(), 1)
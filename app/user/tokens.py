@@ -0,0 +1,151 @@
+"""Stateless access tokens.
+
+An access token is a payload signed with the project's SECRET_KEY
+(``django.core.signing``) that names the user and the refresh token it
+was issued from. Checking it needs no database access. Revocation uses
+a compact deny-list of TokenRevocation rows: one per revoked refresh
+token and one "not before" timestamp per revoked user. Each row lives
+only as long as the access tokens it covers.
+
+Every process checks tokens against its own copy of the deny-list,
+reloaded at most every TOKEN_DENY_LIST_INTERVAL seconds. Revocations
+apply at once in the process that made them, and within that delay in
+the others. The rows also version the users for the token cache of
+user.authentication: any row of a user, including the ones added by
+``invalidate_user`` that deny nothing, outdates the cached copies.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+
+from core.models import RefreshToken, TokenRevocation
+
+SALT = 'user.tokens.access'
+
+
+class DenyList:
+    """Per-process copy of the unexpired TokenRevocation rows."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._refresh_ids = set()
+        self._not_before = {}
+        self._versions = {}
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    def is_denied(self, claims):
+        self._load_if_stale()
+        return claims['r'] in self._refresh_ids or \
+            self._not_before.get(claims['u'], -1) >= claims['iat']
+
+    def version(self, user_id):
+        """The id of the last row of the user, or 0."""
+        self._load_if_stale()
+        return self._versions.get(user_id, 0)
+
+    def add(self, user_id, refresh_id=None, not_before=None):
+        now = int(time.time())
+        TokenRevocation.objects.filter(expires__lte=now).delete()
+        row = TokenRevocation.objects.create(
+            user_id=user_id,
+            refresh_id=refresh_id,
+            not_before=not_before,
+            # Also outlives the token cache entries it outdates.
+            expires=now + max(settings.ACCESS_TOKEN_LIFETIME,
+                              settings.TOKEN_CACHE_TTL) + 1,
+        )
+        with self._lock:
+            self._apply(self._refresh_ids, self._not_before, self._versions,
+                        row.pk, user_id, refresh_id, not_before)
+
+    def reset(self):
+        """Reload the rows on the next check."""
+        with self._lock:
+            self._loaded = None
+
+    def _load_if_stale(self):
+        if not self._is_stale():
+            return
+
+        with self._lock:
+            # Another thread may have loaded the rows in the meantime.
+            if not self._is_stale():
+                return
+            refresh_ids, users, versions = set(), {}, {}
+            rows = TokenRevocation.objects.filter(
+                expires__gt=int(time.time())
+            ).values_list('id', 'user_id', 'refresh_id', 'not_before')
+            for row in rows:
+                self._apply(refresh_ids, users, versions, *row)
+            self._refresh_ids, self._not_before, self._versions = \
+                refresh_ids, users, versions
+            self._loaded = time.monotonic()
+
+    def _is_stale(self):
+        return self._loaded is None or \
+            time.monotonic() - self._loaded >= self.interval
+
+    @staticmethod
+    def _apply(refresh_ids, users, versions, row_id, user_id, refresh_id,
+               not_before):
+        versions[user_id] = max(versions.get(user_id, 0), row_id)
+        if refresh_id is not None:
+            refresh_ids.add(refresh_id)
+        if not_before is not None:
+            users[user_id] = max(users.get(user_id, -1), not_before)
+
+
+deny_list = DenyList(settings.TOKEN_DENY_LIST_INTERVAL)
+
+
+def issue_access_token(user_id, refresh_id):
+    return signing.dumps(
+        {'u': user_id, 'r': refresh_id, 'iat': int(time.time())},
+        salt=SALT
+    )
+
+
+def issue(user):
+    """Create a refresh token for ``user`` and a first access token."""
+    refresh = RefreshToken.objects.create(user=user)
+    return {
+        'access': issue_access_token(user.pk, refresh.pk),
+        'refresh': refresh.key,
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def load_access_token(token):
+    """Return the claims of a valid access token.
+
+    Raises ``signing.BadSignature`` if the token is malformed, expired
+    or revoked.
+    """
+    claims = signing.loads(
+        token, salt=SALT, max_age=settings.ACCESS_TOKEN_LIFETIME)
+
+    if deny_list.is_denied(claims):
+        raise signing.BadSignature('Token revoked.')
+
+    return claims
+
+
+def revoke(refresh):
+    """Delete a refresh token and deny the access tokens issued from it."""
+    deny_list.add(refresh.user_id, refresh_id=refresh.pk)
+    refresh.delete()
+
+
+def revoke_user(user_id):
+    """Deny every access token issued to the user so far."""
+    deny_list.add(user_id, not_before=int(time.time()))
+
+
+def invalidate_user(user_id):
+    """Outdate the cached copies of the user and of their API tokens in
+    every process, without denying any token.
+    """
+    deny_list.add(user_id)
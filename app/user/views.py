@@ -1,21 +1,73 @@
-from rest_framework import generics, authentication, permissions
+from django.conf import settings
+from rest_framework import generics, permissions, status
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from .serializers import UserSerializer, AuthTokenSerializer
+from core.timing import TimedAPIViewMixin
+from . import tokens
+from .authentication import CachedTokenAuthentication
+from .serializers import UserSerializer, AuthTokenSerializer, \
+    RefreshTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(TimedAPIViewMixin, generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(TimedAPIViewMixin, ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
 
-class RetrieveUpdateUserView(generics.RetrieveUpdateAPIView):
-    authentication_classes = (authentication.TokenAuthentication, )
+        if serializer.validated_data['token_type'] == serializer.SIGNED:
+            return Response(tokens.issue(user))
+
+        token, _ = Token.objects.get_or_create(user=user)
+        return Response({'token': token.key})
+
+
+class RefreshAccessTokenView(TimedAPIViewMixin, APIView):
+    authentication_classes = ()
+    permission_classes = ()
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        serializer = RefreshTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        refresh = serializer.validated_data['refresh']
+
+        return Response({
+            'access': tokens.issue_access_token(refresh.user_id, refresh.pk),
+            'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+        })
+
+
+class RevokeTokenView(TimedAPIViewMixin, APIView):
+    authentication_classes = ()
+    permission_classes = ()
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        serializer = RefreshTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens.revoke(serializer.validated_data['refresh'])
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RetrieveUpdateUserView(TimedAPIViewMixin,
+                             generics.RetrieveUpdateAPIView):
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (permissions.IsAuthenticated, )
     serializer_class = UserSerializer
 